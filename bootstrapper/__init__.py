@@ -1,4 +1,7 @@
 import logging
+
+__version__ = '1.0.0'
+
 logger = logging.getLogger(__name__)
 
 RUN_DIRECTORY_KEY='RUN_DIRECTORY_BASE'
@@ -0,0 +1,105 @@
+from collections import namedtuple
+import os, re
+
+
+DEFAULT_SYSFS_ROOT = '/sys'
+
+_CPU_LIST = re.compile(r'^\d+(-\d+)?(,\d+(-\d+)?)*$')
+_AFFINITY_SETTINGS = ('cpus', 'numaNode', 'isolated')
+
+
+Affinity = namedtuple('Affinity', ['cpus', 'numa_node', 'isolated'])
+
+
+def parse_cpu_list(cpus):
+    if isinstance(cpus, int):
+        cpus = str(cpus)
+    elif isinstance(cpus, (list, tuple)):
+        cpus = ",".join(str(cpu) for cpu in cpus)
+    text = cpus.replace(' ', '')
+    if not _CPU_LIST.match(text):
+        raise ValueError("Invalid CPU list '%s' (expected e.g. '2-5,8')" % cpus)
+    result = set()
+    for part in text.split(','):
+        (first, _, last) = part.partition('-')
+        (first, last) = (int(first), int(last or first))
+        if first > last:
+            raise ValueError("Invalid CPU range '%s' in '%s'" % (part, cpus))
+        result.update(range(first, last + 1))
+    return tuple(sorted(result))
+
+
+def format_cpu_list(cpus):
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(first) if first == last else "%d-%d" % (first, last) for (first, last) in ranges)
+
+
+def parse_affinity(configuration):
+    if not configuration:
+        return None
+    unknown = set(configuration) - set(_AFFINITY_SETTINGS)
+    if unknown:
+        raise ValueError("Unknown affinity setting(s) %s (must be one of %s)" % (", ".join(sorted(unknown)), ", ".join(_AFFINITY_SETTINGS)))
+    cpus = configuration.get('cpus')
+    cpus = parse_cpu_list(cpus) if cpus is not None else None
+    numa_node = configuration.get('numaNode')
+    if numa_node is not None:
+        if not str(numa_node).isdigit():
+            raise ValueError("affinity.numaNode '%s' must be a non-negative integer" % numa_node)
+        numa_node = int(numa_node)
+    isolated = configuration.get('isolated', False)
+    if not isinstance(isolated, bool):
+        raise TypeError("affinity.isolated must be true or false (got %r)" % isolated)
+    if cpus is None and numa_node is None:
+        raise ValueError("affinity requires cpus, numaNode or both")
+    if isolated and cpus is None:
+        raise ValueError("affinity.isolated requires an explicit cpus list")
+    return Affinity(cpus, numa_node, isolated)
+
+
+def _read_cpu_list(filename):
+    with open(filename, 'r') as f:
+        text = f.read().strip()
+    return set(parse_cpu_list(text)) if text else set()
+
+
+def validate_affinity(affinity, sysfs_root=DEFAULT_SYSFS_ROOT):
+    cpu_directory = os.path.join(sysfs_root, 'devices', 'system', 'cpu')
+    if affinity.cpus is not None:
+        offline = set(affinity.cpus) - _read_cpu_list(os.path.join(cpu_directory, 'online'))
+        if offline:
+            raise ValueError("CPU(s) %s are not online on this host" % format_cpu_list(offline))
+        if affinity.isolated:
+            shared = set(affinity.cpus) - _read_cpu_list(os.path.join(cpu_directory, 'isolated'))
+            if shared:
+                raise ValueError("CPU(s) %s are not isolated on this host (see isolcpus)" % format_cpu_list(shared))
+
+    if affinity.numa_node is not None:
+        node_directory = os.path.join(sysfs_root, 'devices', 'system', 'node', 'node%d' % affinity.numa_node)
+        if not os.path.isdir(node_directory):
+            raise ValueError("NUMA node %d does not exist on this host" % affinity.numa_node)
+        if affinity.cpus is not None:
+            remote = set(affinity.cpus) - _read_cpu_list(os.path.join(node_directory, 'cpulist'))
+            if remote:
+                raise ValueError("CPU(s) %s do not belong to NUMA node %d" % (format_cpu_list(remote), affinity.numa_node))
+
+
+def affinity_prefix(affinity):
+    if affinity is None:
+        return []
+    if affinity.numa_node is None:
+        return ['taskset', '--cpu-list', format_cpu_list(affinity.cpus)]
+    prefix = ['numactl', '--membind=%d' % affinity.numa_node]
+    if affinity.cpus is None:
+        prefix.append('--cpunodebind=%d' % affinity.numa_node)
+    else:
+        prefix.append('--physcpubind=%s' % format_cpu_list(affinity.cpus))
+    return prefix
+
+
+__all__ = ['DEFAULT_SYSFS_ROOT', 'Affinity', 'parse_cpu_list', 'format_cpu_list', 'parse_affinity', 'validate_affinity', 'affinity_prefix']
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+import os
+import threading
+
+
+def file_identity(filename):
+    status = os.stat(filename)
+    return (status.st_mtime_ns, status.st_size, status.st_ino)
+
+
+def single_entry(value):
+    # A sizeof() for caches bounded by their number of entries rather than by bytes
+    return 1
+
+
+class FileCache(object):
+    def __init__(self, loader, max_size=None, sizeof=None):
+        # With max_size the least recently used entries are evicted once the values' total sizeof() exceeds it
+        self._loader = loader
+        self._max_size = max_size
+        self._sizeof = sizeof
+        self._size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    def get(self, *filenames):
+        paths = tuple(os.path.abspath(filename) for filename in filenames)
+        identity = tuple(file_identity(path) for path in paths)
+        with self._lock:
+            entry = self._entries.get(paths)
+            if entry is not None and entry[0] == identity:
+                self._entries.move_to_end(paths)
+                self._hits += 1
+                return entry[1]
+
+        value = self._loader(*paths)
+        with self._lock:
+            self._misses += 1
+            self._store(paths, identity, value)
+        return value
+
+    def _store(self, paths, identity, value):
+        if self._max_size is None:
+            self._entries[paths] = (identity, value, 0)
+            return
+        size = self._sizeof(value)
+        previous = self._entries.pop(paths, None)
+        if previous is not None:
+            self._size -= previous[2]
+        if size > self._max_size:
+            return
+        self._entries[paths] = (identity, value, size)
+        self._size += size
+        while self._size > self._max_size:
+            (_, evicted) = self._entries.popitem(last=False)
+            self._size -= evicted[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._hits = 0
+            self._misses = 0
+
+
+__all__ = ['file_identity', 'single_entry', 'FileCache']
@@ -0,0 +1,120 @@
+from . import logger
+from collections import namedtuple
+import os
+
+
+DEFAULT_CGROUP_ROOT = '/sys/fs/cgroup'
+DEFAULT_PROC_CGROUP = '/proc/self/cgroup'
+
+# cgroup v1 reports "no limit" as the largest page-aligned signed 64-bit value
+_V1_UNLIMITED = 0x7FFFFFFFFFFFF000
+_V1_CONTROLLER_DIRECTORIES = {'memory': ('memory',), 'cpu': ('cpu', 'cpu,cpuacct', 'cpuacct,cpu')}
+
+
+ResourceLimits = namedtuple('ResourceLimits', ['memory', 'cpus'])
+
+
+def _read(filename):
+    try:
+        with open(filename, 'r') as f:
+            return f.read().strip()
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return None
+
+
+def _own_cgroups(proc_cgroup):
+    # Maps each controller (or '' for the v2 unified hierarchy) to this process's cgroup path
+    cgroups = {}
+    contents = _read(proc_cgroup) or ''
+    for line in contents.splitlines():
+        (_, controllers, path) = line.split(':', 2)
+        for controller in controllers.split(','):
+            cgroups[controller] = path
+    return cgroups
+
+
+def _ancestors(directory, path):
+    # The effective limit is the tightest one between the process's cgroup and the hierarchy root
+    parts = [part for part in path.split('/') if part]
+    for depth in range(len(parts), -1, -1):
+        yield os.path.join(directory, *parts[:depth])
+
+
+def _tightest(values):
+    values = [value for value in values if value is not None]
+    return min(values) if values else None
+
+
+def _v2_memory(directory):
+    value = _read(os.path.join(directory, 'memory.max'))
+    return None if value in (None, 'max') else int(value)
+
+
+def _v2_cpus(directory):
+    value = _read(os.path.join(directory, 'cpu.max'))
+    if value is None:
+        return None
+    (quota, period) = (value.split() + ['100000'])[:2]
+    return None if quota == 'max' else int(quota) / int(period)
+
+
+def _v1_memory(directory):
+    value = _read(os.path.join(directory, 'memory.limit_in_bytes'))
+    if value is None or int(value) >= _V1_UNLIMITED:
+        return None
+    return int(value)
+
+
+def _v1_cpus(directory):
+    quota = _read(os.path.join(directory, 'cpu.cfs_quota_us'))
+    period = _read(os.path.join(directory, 'cpu.cfs_period_us'))
+    if quota is None or period is None or int(quota) <= 0:
+        return None
+    return int(quota) / int(period)
+
+
+def _v1_controller_directory(cgroup_root, controller):
+    for name in _V1_CONTROLLER_DIRECTORIES[controller]:
+        directory = os.path.join(cgroup_root, name)
+        if os.path.isdir(directory):
+            return directory
+    return None
+
+
+def read_cgroup_limits(cgroup_root=DEFAULT_CGROUP_ROOT, proc_cgroup=DEFAULT_PROC_CGROUP):
+    cgroups = _own_cgroups(proc_cgroup)
+    if os.path.exists(os.path.join(cgroup_root, 'cgroup.controllers')):
+        directories = list(_ancestors(cgroup_root, cgroups.get('', '/')))
+        limits = ResourceLimits(_tightest(_v2_memory(d) for d in directories), _tightest(_v2_cpus(d) for d in directories))
+    else:
+        memory_directory = _v1_controller_directory(cgroup_root, 'memory')
+        cpu_directory = _v1_controller_directory(cgroup_root, 'cpu')
+        memory = None
+        if memory_directory is not None:
+            memory = _tightest(_v1_memory(d) for d in _ancestors(memory_directory, cgroups.get('memory', '/')))
+        cpus = None
+        if cpu_directory is not None:
+            cpus = _tightest(_v1_cpus(d) for d in _ancestors(cpu_directory, cgroups.get('cpu', '/')))
+        limits = ResourceLimits(memory, cpus)
+    logger.debug("cgroup limits under %s: %s", cgroup_root, limits)
+    return limits
+
+
+def host_resources():
+    memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count()
+    return ResourceLimits(memory, cpus)
+
+
+def effective_resources(cgroup_root=DEFAULT_CGROUP_ROOT, proc_cgroup=DEFAULT_PROC_CGROUP):
+    limits = read_cgroup_limits(cgroup_root, proc_cgroup)
+    host = host_resources()
+    memory = host.memory if limits.memory is None else min(limits.memory, host.memory)
+    cpus = host.cpus if limits.cpus is None else min(limits.cpus, host.cpus)
+    return ResourceLimits(memory, cpus)
+
+
+__all__ = ['DEFAULT_CGROUP_ROOT', 'DEFAULT_PROC_CGROUP', 'ResourceLimits', 'read_cgroup_limits', 'host_resources', 'effective_resources']
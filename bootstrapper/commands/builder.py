@@ -1,7 +1,8 @@
 from .. import logger
+from ..tree import EXECUTABLE_FILE_MODE, RenderedFile, RenderedTree, capture_tree
 from abc import ABCMeta, abstractmethod
 from contextlib import contextmanager
-import os, stat, subprocess, shlex
+import os, subprocess, shlex, tempfile
 
 
 @contextmanager
@@ -14,20 +15,53 @@ def run_in_directory(directory):
         os.chdir(current_directory)
 
 
+class _RedirectedDeployment(object):
+    # Lets a builder that only knows how to write files write them somewhere other than the deployment's output directory
+    def __init__(self, deployment, output_directory):
+        self._deployment = deployment
+        self._output_directory = output_directory
+
+    def __getattr__(self, name):
+        return getattr(self._deployment, name)
+
+    @property
+    def output_directory(self):
+        return self._output_directory
+
+
 class Builder(object, metaclass=ABCMeta):
+    _TRANSIENT_ATTRIBUTES = ()
+
     def build_properties(self, properties):
         pass
 
+    @property
+    def fingerprint(self):
+        state = sorted((name, repr(value)) for (name, value) in vars(self).items() if name not in self._TRANSIENT_ATTRIBUTES)
+        return "%s.%s%r" % (self.__class__.__module__, self.__class__.__qualname__, state)
+
     @abstractmethod
     def build(self, deployment):
         raise NotImplemented()
 
-    @abstractmethod
+    def render(self, deployment):
+        if self.__class__.write_to_file is Builder.write_to_file:
+            raise NotImplementedError("%s must implement render() or write_to_file()" % self.__class__.__name__)
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_to_file(_RedirectedDeployment(deployment, directory))
+            return capture_tree(directory)
+
+    @property
+    def renders_in_memory(self):
+        return self.__class__.render is not Builder.render
+
     def write_to_file(self, deployment):
-        raise NotImplemented()
+        self.render(deployment).write_to(deployment.output_directory)
 
 
 class CommandBuilder(Builder, metaclass=ABCMeta):
+    _TRANSIENT_ATTRIBUTES = ('_arguments',)
+
     def __str__(self):
         return self.command
 
@@ -52,22 +86,18 @@ class CommandBuilder(Builder, metaclass=ABCMeta):
     def add_argument(self, string_format, *format_values):
         self._arguments += [x.strip() for x in shlex.split(string_format % format_values) if len(x.strip()) > 0]
 
-    def write_to_file(self, deployment):
-        self._write_to_file(deployment)
-
-    def _write_to_file(self, deployment, *extra_commands):
-        scripts_directory = os.path.join(deployment.output_directory, 'scripts')
-        script_filename = os.path.join(scripts_directory, deployment.configuration.start_script_filename)
-        if not os.path.isdir(scripts_directory):
-            os.makedirs(scripts_directory)
-        with open(script_filename, 'w') as f:
-            f.write('#!/bin/sh\n')
-            for cmd in extra_commands:
-                f.write("%s\n" % cmd)
-            cmd = " ".join(self.command)
-            f.write('echo "%s"\n' % cmd.translate({'"': r'\"', '$': r'\$' }))
-            f.write(cmd)
-        os.chmod(script_filename, stat.S_IXUSR | os.stat(script_filename).st_mode)
+    def render(self, deployment):
+        return self._render_script(deployment)
+
+    def _render_script(self, deployment, *extra_commands):
+        lines = ['#!/bin/sh\n']
+        for cmd in extra_commands:
+            lines.append("%s\n" % cmd)
+        cmd = " ".join(self.command)
+        lines.append('echo "%s"\n' % cmd.translate({'"': r'\"', '$': r'\$' }))
+        lines.append(cmd)
+        script_filename = os.path.join('scripts', deployment.configuration.start_script_filename)
+        return RenderedTree({script_filename: RenderedFile(''.join(lines), EXECUTABLE_FILE_MODE)})
 
     @abstractmethod
     def execute(self, runner):
@@ -1,17 +1,84 @@
-from .builder import CommandBuilder
+from .builder import CommandBuilder, run_in_directory
+from bootstrapper.affinity import DEFAULT_SYSFS_ROOT, format_cpu_list, parse_affinity, validate_affinity
+from bootstrapper.utils import parse_size
+from bootstrapper import logger
+from collections.abc import Mapping
+import os, subprocess
+
+
+_HOST_NETWORK = 'host'
+_NONE_NETWORK = 'none'
+_CONTAINER_NETWORK_PREFIX = 'container:'
+_IPC_MODES = ('none', 'private', 'shareable', 'host')
+_ULIMITS = ('memlock', 'nofile')
+_UNLIMITED = -1
+# Docker refuses memory limits below 6MB
+_MIN_MEMORY_LIMIT = 6 * 1024 * 1024
+
+
+def _ulimit_value(name, value):
+    if value in ('unlimited', _UNLIMITED):
+        return _UNLIMITED
+    if name == 'memlock':
+        value = parse_size(value)
+    else:
+        value = int(value)
+    if value < 0:
+        raise ValueError("ulimit %s must be non-negative or 'unlimited' (got %s)" % (name, value))
+    return value
+
+
+def _ulimit(name, value):
+    if name not in _ULIMITS:
+        raise ValueError("Unsupported ulimit '%s' (must be one of %s)" % (name, ", ".join(_ULIMITS)))
+    if isinstance(value, Mapping):
+        (soft, hard) = (_ulimit_value(name, value['soft']), _ulimit_value(name, value.get('hard', value['soft'])))
+    else:
+        soft = hard = _ulimit_value(name, value)
+    if hard != _UNLIMITED and (soft == _UNLIMITED or soft > hard):
+        raise ValueError("ulimit %s soft limit %s exceeds its hard limit %s" % (name, soft, hard))
+    return (soft, hard)
 
 
 class DockerConfiguration(object):
     def __init__(self, configuration):
         self._configuration = configuration
 
+    @property
+    def _container(self):
+        return self._configuration.get('dockerContainer', {})
+
     @property
     def volumes(self):
-        return self._configuration.get('dockerContainer', {}).get('volumes', [])
+        return self._container.get('volumes', [])
 
     @property
     def ports(self):
-        return self._configuration.get('dockerContainer', {}).get('ports', [])
+        return self._container.get('ports', [])
+
+    @property
+    def cpus(self):
+        return self._container.get('cpus')
+
+    @property
+    def shm_size(self):
+        return self._container.get('shmSize')
+
+    @property
+    def ulimits(self):
+        return self._container.get('ulimits', {})
+
+    @property
+    def network(self):
+        return self._container.get('network')
+
+    @property
+    def ipc(self):
+        return self._container.get('ipc')
+
+    @property
+    def affinity(self):
+        return parse_affinity(self._configuration.get('vmArgs', {}).get('affinity'))
 
     @property
     def min_memory(self):
@@ -23,6 +90,11 @@ class DockerConfiguration(object):
 
 
 class DockerCommandBuilder(CommandBuilder):
+    _TRANSIENT_ATTRIBUTES = CommandBuilder._TRANSIENT_ATTRIBUTES + ('_affinity',)
+
+    def __init__(self, sysfs_root=DEFAULT_SYSFS_ROOT):
+        self._sysfs_root = sysfs_root
+
     @property
     def executable(self):
         return "docker run"
@@ -31,8 +103,13 @@ class DockerCommandBuilder(CommandBuilder):
         configuration = DockerConfiguration(deployment.configuration)
         self._build_docker_base_arguments()
         self._build_names(deployment.environment, deployment.data_center, deployment.stripe, deployment.application, deployment.instance)
-        self._build_ports(configuration.ports)
+        self._build_network(configuration.network, configuration.ports)
         self._build_volumes(configuration.volumes)
+        self._build_memory(configuration.min_memory, configuration.max_memory)
+        self._build_cpus(configuration.cpus)
+        self._build_ipc(configuration.ipc, configuration.shm_size)
+        self._build_ulimits(configuration.ulimits)
+        self._build_affinity(configuration.affinity)
 
     def _build_docker_base_arguments(self):
         self.add_argument("--detach")
@@ -48,18 +125,77 @@ class DockerCommandBuilder(CommandBuilder):
             else:
                 self.add_argument("--publish %d", int(port))
 
+    def _build_network(self, network, ports):
+        if network is None:
+            self._build_ports(ports)
+        elif network == _HOST_NETWORK:
+            # The container shares the host's network stack, so there is nothing to publish (and no NAT in the path)
+            if ports:
+                logger.info("Not publishing ports %s since the container uses the host network", ports)
+            self.add_argument("--network %s", _HOST_NETWORK)
+        elif network == _NONE_NETWORK or network.startswith(_CONTAINER_NETWORK_PREFIX):
+            # Docker only rejects these at run time, long after the deployment has been generated
+            if ports:
+                raise ValueError("Ports %s cannot be published with network '%s'" % (ports, network))
+            self.add_argument("--network %s", network)
+        else:
+            self.add_argument("--network %s", network)
+            self._build_ports(ports)
+
+    def _build_memory(self, min_memory, max_memory):
+        if max_memory is not None:
+            if parse_size(max_memory) < _MIN_MEMORY_LIMIT:
+                raise ValueError("memory.max %s is below docker's minimum of 6m" % max_memory)
+            self.add_argument("--memory %s", max_memory)
+        if min_memory is not None:
+            if max_memory is not None and parse_size(min_memory) > parse_size(max_memory):
+                raise ValueError("memory.min %s is larger than memory.max %s" % (min_memory, max_memory))
+            self.add_argument("--memory-reservation %s", min_memory)
+
+    def _build_cpus(self, cpus):
+        if cpus is not None:
+            if float(cpus) <= 0:
+                raise ValueError("dockerContainer.cpus must be positive (got %s)" % cpus)
+            self.add_argument("--cpus %s", cpus)
+
+    def _build_ipc(self, ipc, shm_size):
+        if ipc is not None:
+            if ipc not in _IPC_MODES and not ipc.startswith('container:'):
+                raise ValueError("Unknown dockerContainer.ipc mode '%s' (must be one of %s or container:<name>)" % (ipc, ", ".join(_IPC_MODES)))
+            self.add_argument("--ipc %s", ipc)
+        if shm_size is not None:
+            if ipc == 'host' or ipc == 'none' or (ipc or '').startswith('container:'):
+                raise ValueError("dockerContainer.shmSize cannot be used with ipc mode '%s'" % ipc)
+            parse_size(shm_size)
+            self.add_argument("--shm-size %s", shm_size)
+
+    def _build_ulimits(self, ulimits):
+        for name in sorted(ulimits):
+            self.add_argument("--ulimit %s=%d:%d", name, *_ulimit(name, ulimits[name]))
+
     def _build_volumes(self, volumes):
         for volume in volumes:
             self.add_argument("--volume %s:%s", volume['host'], volume['container'])
 
+    def _build_affinity(self, affinity):
+        self._affinity = affinity
+        if affinity is None:
+            return
+        if affinity.cpus is not None:
+            self.add_argument("--cpuset-cpus %s", format_cpu_list(affinity.cpus))
+        if affinity.numa_node is not None:
+            self.add_argument("--cpuset-mems %d", affinity.numa_node)
+
     def execute(self, runner):
-        image = "%s:%s" % (runner.version_info['image_name'], runner.version_info['image_version'])
+        if self._affinity is not None:
+            validate_affinity(self._affinity, self._sysfs_root)
+        image = "%s:%s" % (runner.deployment_info['image_name'], runner.deployment_info['image_version'])
         self._pull_docker_image(image)
         run_directory = runner.run_directory
         if runner.run_directory.startswith(os.getcwd()):
             run_directory = run_directory[len(os.getcwd()):]
         with run_in_directory(runner.run_directory):
-            return self._do_execute(self.command + ['--workdir', run_directory, image, os.path.join('scripts', self.start_script_filename)])
+            return self._do_execute(self.command + ['--workdir', run_directory, image, os.path.join('scripts', runner.deployment.configuration.start_script_filename)])
 
     def _pull_docker_image(self, image):
         return subprocess.run(['docker', 'pull', image], stderr=subprocess.STDOUT)
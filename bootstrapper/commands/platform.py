@@ -1,6 +1,12 @@
 from .builder import CommandBuilder, Builder
+from .profiles import merge_jvm_arguments
+from bootstrapper.affinity import DEFAULT_SYSFS_ROOT, affinity_prefix, parse_affinity, validate_affinity
+from bootstrapper.cgroup import DEFAULT_CGROUP_ROOT, effective_resources
 from bootstrapper.properties import *
 from bootstrapper.deployment import *
+from bootstrapper.tree import RenderedFile, RenderedTree
+from bootstrapper.utils import format_size, parse_size
+import math, shlex
 
 
 class PlatformJvmConfiguration(object):
@@ -15,6 +21,10 @@ class PlatformJvmConfiguration(object):
     def base_jvm_configuration(self):
         return self.vm_configuration.get('baseArgs', [])
 
+    @property
+    def jvm_profile(self):
+        return self.vm_configuration.get('profile')
+
     @property
     def _memory(self):
         return self._configuration.get('memory', {})
@@ -27,6 +37,19 @@ class PlatformJvmConfiguration(object):
     def max_heap(self):
         return self._memory.get('max')
 
+    @property
+    def auto_memory(self):
+        auto = self._memory.get('auto')
+        if auto is None or auto is False:
+            return None
+        if auto is True:
+            return {}
+        return auto
+
+    @property
+    def affinity(self):
+        return parse_affinity(self.vm_configuration.get('affinity'))
+
     @property
     def connection_configuration(self):
         return self.vm_configuration.get('connections', {})
@@ -87,8 +110,28 @@ _MC_ENVIRONMENTS = {
         }
 
 
-def _write_line_to_file(line, output_file, properties):
-    output_file.write(properties.apply_to_value(line))
+_DEFAULT_HEAP_FRACTION = 0.6
+_AUTO_MEMORY_SETTINGS = ('heapFraction', 'initialHeapFraction')
+_HEAP_ALIGNMENT = 1024 * 1024
+
+
+def _heap_fractions(auto_memory):
+    unknown = set(auto_memory) - set(_AUTO_MEMORY_SETTINGS)
+    if unknown:
+        raise ValueError("Unknown memory.auto setting(s) %s (must be one of %s)" % (", ".join(sorted(unknown)), ", ".join(_AUTO_MEMORY_SETTINGS)))
+    heap_fraction = float(auto_memory.get('heapFraction', _DEFAULT_HEAP_FRACTION))
+    initial_heap_fraction = float(auto_memory.get('initialHeapFraction', heap_fraction))
+    if not 0 < heap_fraction <= 1:
+        raise ValueError("memory.auto.heapFraction %g must be in (0, 1]" % heap_fraction)
+    if not 0 < initial_heap_fraction <= heap_fraction:
+        raise ValueError("memory.auto.initialHeapFraction %g must be in (0, heapFraction]" % initial_heap_fraction)
+    return (heap_fraction, initial_heap_fraction)
+
+
+def _gc_threads(cpus):
+    # Mirrors HotSpot's own ergonomics, but from the container's CPU quota rather than the host's CPU count
+    parallel = cpus if cpus <= 8 else 8 + (cpus - 8) * 5 // 8
+    return (parallel, max(1, (parallel + 2) // 4))
 
 
 class StreamBuilder(Builder):
@@ -123,18 +166,14 @@ class StreamBuilder(Builder):
     def build(self, deployment):
         pass
 
-    def write_to_file(self, deployment):
+    def render(self, deployment):
+        tree = RenderedTree()
         lines = self._get_lines()
         if lines:
             configuration = PlatformJvmConfiguration(deployment.configuration)
-            config_directory = os.path.join(deployment.output_directory, configuration.config_directory)
-            if not os.path.isdir(config_directory):
-                os.makedirs(config_directory)
-            with open(os.path.join(config_directory, self._get_filename(deployment)), 'w') as stream_file:
-                _write_line_to_file(lines[0], stream_file, deployment.properties)
-                for line in lines[1:]:
-                    stream_file.write('\n')
-                    _write_line_to_file(line, stream_file, deployment.properties)
+            filename = os.path.join(configuration.config_directory, self._get_filename(deployment))
+            tree[filename] = RenderedFile('\n'.join(deployment.properties.apply_to_value(line) for line in lines))
+        return tree
 
     def _get_lines(self):
         return []
@@ -201,10 +240,14 @@ class RewinderCommandsFileBuilder(StreamBuilder):
 
 
 class PlatformCommandBuilder(CommandBuilder, StreamBuilder):
-    def __init__(self, text_admin_port=0):
+    _TRANSIENT_ATTRIBUTES = CommandBuilder._TRANSIENT_ATTRIBUTES + ('_heap_fractions', '_affinity')
+
+    def __init__(self, text_admin_port=0, cgroup_root=DEFAULT_CGROUP_ROOT, sysfs_root=DEFAULT_SYSFS_ROOT):
         if text_admin_port < 0:
             raise ValueError("Text admin port %d must be a positive integer" % text_admin_port)
         self._text_admin_port = text_admin_port
+        self._cgroup_root = cgroup_root
+        self._sysfs_root = sysfs_root
 
     @property
     def executable(self):
@@ -212,8 +255,9 @@ class PlatformCommandBuilder(CommandBuilder, StreamBuilder):
 
     def do_build(self, deployment):
         configuration = PlatformJvmConfiguration(deployment.configuration)
-        self._build_memory_arguments(configuration.min_heap, configuration.max_heap)
-        self._build_base_jvm_arguments(configuration.base_jvm_configuration)
+        self._affinity = configuration.affinity
+        self._build_memory_arguments(configuration.min_heap, configuration.max_heap, configuration.auto_memory)
+        self._build_base_jvm_arguments(configuration.base_jvm_configuration, configuration.jvm_profile)
         self._build_platform_arguments(configuration.platform_configuration)
         self._build_text_admin_argument(configuration.text_admin_port)
         self._build_connection_arguments(configuration.connection_configuration)
@@ -222,16 +266,56 @@ class PlatformCommandBuilder(CommandBuilder, StreamBuilder):
         self._build_package_scanner_argument()
         self._build_application_name_argument(deployment.stripe)
 
-    def write_to_file(self, deployment):
-        self._write_to_file(deployment, "echo -n 'Current directory is: '", "pwd", "ls *")
+    def render(self, deployment):
+        return self._render_script(deployment, "echo -n 'Current directory is: '", "pwd", "ls *")
 
-    def _build_memory_arguments(self, min_heap, max_heap):
+    @property
+    def command(self):
+        return self._command(self._ergonomic_memory_arguments())
+
+    def _command(self, memory_arguments):
+        return affinity_prefix(self._affinity) + shlex.split(self.executable) + memory_arguments + self._arguments
+
+    def _ergonomic_memory_arguments(self):
+        # The start script is rendered at deploy time, so it leaves sizing to the JVM's own container support
+        if self._heap_fractions is None:
+            return []
+        (heap_fraction, initial_heap_fraction) = self._heap_fractions
+        return ["-XX:InitialRAMPercentage=%g" % (initial_heap_fraction * 100), "-XX:MaxRAMPercentage=%g" % (heap_fraction * 100)]
+
+    def _host_memory_arguments(self):
+        if self._heap_fractions is None:
+            return []
+        (heap_fraction, initial_heap_fraction) = self._heap_fractions
+        resources = effective_resources(self._cgroup_root)
+        cpus = max(1, int(math.ceil(resources.cpus)))
+        (parallel_gc_threads, concurrent_gc_threads) = _gc_threads(cpus)
+        logger.info("Sizing JVM for %s of memory and %g CPU(s)", format_size(resources.memory), resources.cpus)
+        return ["-Xms%s" % format_size(int(resources.memory * initial_heap_fraction) // _HEAP_ALIGNMENT * _HEAP_ALIGNMENT),
+                "-Xmx%s" % format_size(int(resources.memory * heap_fraction) // _HEAP_ALIGNMENT * _HEAP_ALIGNMENT),
+                "-XX:ActiveProcessorCount=%d" % cpus,
+                "-XX:ParallelGCThreads=%d" % parallel_gc_threads,
+                "-XX:ConcGCThreads=%d" % concurrent_gc_threads]
+
+    def _build_memory_arguments(self, min_heap, max_heap, auto_memory=None):
+        self._heap_fractions = None
+        if auto_memory is not None:
+            if min_heap or max_heap:
+                raise ValueError("memory.auto cannot be combined with memory.min or memory.max")
+            self._heap_fractions = _heap_fractions(auto_memory)
+            return
+        if min_heap and max_heap and parse_size(min_heap) > parse_size(max_heap):
+            raise ValueError("memory.min %s is larger than memory.max %s" % (min_heap, max_heap))
         if min_heap:
             self.add_argument("-Xms%s", min_heap)
         if max_heap:
             self.add_argument("-Xmx%s", max_heap)
 
-    def _build_base_jvm_arguments(self, base_jvm_configuration):
+    def _build_base_jvm_arguments(self, base_jvm_configuration, jvm_profile=None):
+        if jvm_profile is not None:
+            # merge_jvm_arguments has already tokenized baseArgs; splitting them again would break quoted values
+            self._arguments += merge_jvm_arguments(jvm_profile, base_jvm_configuration)
+            return
         for jvm_argument in base_jvm_configuration:
             self.add_argument(jvm_argument)
 
@@ -283,4 +367,6 @@ class PlatformCommandBuilder(CommandBuilder, StreamBuilder):
         self.add_argument("%s.commands", application_name)
 
     def execute(self, runner):
-        return self._do_execute(self.command)
+        if self._affinity is not None:
+            validate_affinity(self._affinity, self._sysfs_root)
+        return self._do_execute(self._command(self._host_memory_arguments()))
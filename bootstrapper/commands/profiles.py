@@ -0,0 +1,87 @@
+from .. import logger
+import shlex
+
+
+LOW_LATENCY = 'low-latency'
+THROUGHPUT = 'throughput'
+SMALL_FOOTPRINT = 'small-footprint'
+
+# Every preset states its string deduplication choice explicitly: it costs GC work, so only small-footprint trades that for heap
+JVM_PROFILES = {
+        LOW_LATENCY: (
+            '-XX:+UseG1GC',
+            '-XX:MaxGCPauseMillis=20',
+            '-XX:+AlwaysPreTouch',
+            '-XX:+UseLargePages',
+            '-XX:ReservedCodeCacheSize=256m',
+            '-XX:-UseStringDeduplication',
+            '-XX:+PerfDisableSharedMem'),
+        THROUGHPUT: (
+            '-XX:+UseParallelGC',
+            '-XX:+AlwaysPreTouch',
+            '-XX:+UseLargePages',
+            '-XX:ReservedCodeCacheSize=256m',
+            '-XX:-UseStringDeduplication'),
+        SMALL_FOOTPRINT: (
+            '-XX:+UseSerialGC',
+            '-XX:-AlwaysPreTouch',
+            '-XX:-UseLargePages',
+            '-XX:ReservedCodeCacheSize=64m',
+            '-XX:MaxMetaspaceSize=128m',
+            '-XX:+UseStringDeduplication',
+            '-Xss512k'),
+        }
+
+_GC_SELECTORS = ('UseSerialGC', 'UseParallelGC', 'UseParallelOldGC', 'UseConcMarkSweepGC', 'UseG1GC', 'UseZGC', 'UseShenandoahGC', 'UseEpsilonGC')
+_SIZE_OPTIONS = ('-Xms', '-Xmx', '-Xmn', '-Xss')
+
+
+def _option(argument):
+    # Returns the name an argument sets (so that two arguments for the same option can be compared) and its value
+    if argument.startswith('-XX:+') or argument.startswith('-XX:-'):
+        return (argument[5:], argument[4] == '+')
+    if argument.startswith('-XX:'):
+        (name, _, value) = argument[4:].partition('=')
+        return (name, value)
+    if argument.startswith('-D'):
+        (name, _, value) = argument.partition('=')
+        return (name, value)
+    for prefix in _SIZE_OPTIONS:
+        if argument.startswith(prefix):
+            return (prefix, argument[len(prefix):])
+    return (argument, None)
+
+
+def _split(arguments):
+    for argument in arguments:
+        for part in shlex.split(argument):
+            if part.strip():
+                yield part.strip()
+
+
+def merge_jvm_arguments(profile, base_arguments):
+    if profile not in JVM_PROFILES:
+        raise ValueError("Unknown JVM profile '%s' (must be one of %s)" % (profile, ", ".join(sorted(JVM_PROFILES))))
+
+    merged = {}
+    for argument in JVM_PROFILES[profile]:
+        merged[_option(argument)[0]] = argument
+
+    overrides = {}
+    for argument in _split(base_arguments):
+        name = _option(argument)[0]
+        if name in overrides and overrides[name] != argument:
+            raise ValueError("Conflicting JVM arguments '%s' and '%s' in vmArgs.baseArgs" % (overrides[name], argument))
+        overrides[name] = argument
+        if name in merged and merged[name] != argument:
+            logger.debug("vmArgs.baseArgs '%s' overrides '%s' from the %s profile", argument, merged[name], profile)
+        merged[name] = argument
+
+    collectors = [name for name in _GC_SELECTORS if merged.get(name) == '-XX:+%s' % name]
+    if len(collectors) > 1:
+        raise ValueError("JVM arguments select more than one garbage collector (%s); to replace the %s profile's collector disable it explicitly with -XX:-%s" %
+                (", ".join(collectors), profile, _option(JVM_PROFILES[profile][0])[0]))
+    return list(merged.values())
+
+
+__all__ = ['LOW_LATENCY', 'THROUGHPUT', 'SMALL_FOOTPRINT', 'JVM_PROFILES', 'merge_jvm_arguments']
@@ -1,79 +1,155 @@
-import copy
+from .cache import FileCache, single_entry
+from collections.abc import Mapping
+import json
 
 
 DEFAULT_START_SCRIPT_FILENAME = 'start_app.sh'
+JSON_FILE_CACHE_ENTRIES = 4096
 
 
-def _apply_properties_to_dict(result, properties):
-    for (name, value) in result.items():
-        name = _clean_name(name, result, properties)
-        value = _clean_value(value, properties)
-        result[name] = value
+def _immutable(self, *args, **kwargs):
+    raise TypeError("'%s' object is immutable" % self.__class__.__name__)
 
 
-def _clean_name(name, result, properties):
-    if name != properties.apply_to_value(name):
-        del result[name]
-        return properties.apply_to_value(name)
-    return name
+class FrozenDict(dict):
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
 
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
 
-def _clean_value(value, properties):
+
+class FrozenList(list):
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = extend = insert = pop = remove = clear = sort = reverse = _immutable
+
+    def __reduce__(self):
+        return (self.__class__, (list(self),))
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return FrozenDict((name, _freeze(item)) for (name, item) in value.items())
+    elif isinstance(value, list):
+        return FrozenList(_freeze(item) for item in value)
+    return value
+
+
+def _load_json_file(filename):
+    with open(filename, 'r') as json_file:
+        return _freeze(json.load(json_file))
+
+
+json_file_cache = FileCache(_load_json_file, JSON_FILE_CACHE_ENTRIES, single_entry)
+
+
+def load_json_file(filename):
+    return json_file_cache.get(filename)
+
+
+def _apply_properties_to_value(value, properties):
     if isinstance(value, dict):
-        return _clean_dict(value, properties)
+        return _apply_properties_to_dict(value, properties)
     elif isinstance(value, list):
-        return _clean_list(value, properties)
+        return _apply_properties_to_list(value, properties)
     else:
         return properties.apply_to_value(value)
 
 
-def _clean_dict(value, properties):
-    _apply_properties_to_dict(value, properties)
-    return value
+def _apply_properties_to_dict(values, properties):
+    items = [(properties.apply_to_value(name), _apply_properties_to_value(value, properties)) for (name, value) in values.items()]
+    if all((new_name is name) and (new_value is value) for ((new_name, new_value), (name, value)) in zip(items, values.items())):
+        return values
+    return dict(items)
 
 
-def _clean_list(values, properties):
-    return [_clean_value(value, properties) for value in values]
+def _apply_properties_to_list(values, properties):
+    items = [_apply_properties_to_value(value, properties) for value in values]
+    if all(new_value is value for (new_value, value) in zip(items, values)):
+        return values
+    return items
 
 
 def _merge_dict(result, other):
     if result is None or other is None:
-        return
+        return result
 
+    merged = dict(result)
     for key2, val2 in other.items():
-        if key2 in result:
-            val1 = result[key2]
+        if key2 in merged:
+            val1 = merged[key2]
             if not isinstance(val1, list) and not isinstance(val1, dict):
-                result[key2] = str(val2)
-            elif isinstance(val1, list) and isinstance(val1, list):
-                result[key2] = val1 + val2
+                merged[key2] = str(val2)
+            elif isinstance(val1, list):
+                merged[key2] = val1 + val2
             else:
-                _merge_dict(val1, val2)
+                merged[key2] = _merge_dict(val1, val2)
         else:
-            result[key2] = val2
+            merged[key2] = val2
+    return merged
+
+
+class _ConfigurationAccessors(object):
+    @property
+    def application_type(self):
+        return self['appType']
 
+    @property
+    def start_script_filename(self):
+        return self.get('start_script_filename', DEFAULT_START_SCRIPT_FILENAME)
 
-class Configuration(dict):
+
+class Configuration(_ConfigurationAccessors, dict):
     def __init__(self, config={}):
-        super(Configuration, self).__init__(copy.deepcopy(config))
+        super(Configuration, self).__init__(config)
 
     def merge_with(self, other):
-        result = self.__class__(self)
-        _merge_dict(result, other)
-        return result
+        return self.__class__(_merge_dict(self, other))
 
     def apply_properties(self, properties):
-        result = self.__class__(self)
-        _apply_properties_to_dict(result, properties)
-        return result
+        return self.__class__(_apply_properties_to_dict(self, properties))
 
-    @property
-    def application_type(self):
-        return self['appType']
+    def apply_properties_lazily(self, properties):
+        return LazyConfiguration(self, properties)
+
+
+def _apply_properties_lazily(value, properties):
+    if isinstance(value, dict):
+        return LazyConfiguration(value, properties)
+    else:
+        return _apply_properties_to_value(value, properties)
+
+
+class LazyConfiguration(_ConfigurationAccessors, Mapping):
+    def __init__(self, configuration, properties):
+        self._configuration = configuration
+        self._properties = properties
+        self._names = None
+        self._values = {}
+
+    def __getitem__(self, name):
+        if name not in self._values:
+            value = self._configuration[self._expanded_names[name]]
+            self._values[name] = _apply_properties_lazily(value, self._properties)
+        return self._values[name]
+
+    def __iter__(self):
+        return iter(self._expanded_names)
+
+    def __len__(self):
+        return len(self._expanded_names)
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self._configuration)
 
     @property
-    def start_script_filename(self):
-        return self.get('start_script_filename', DEFAULT_START_SCRIPT_FILENAME)
+    def _expanded_names(self):
+        if self._names is None:
+            self._names = {self._properties.apply_to_value(name): name for name in self._configuration}
+        return self._names
+
+    def materialize(self):
+        return Configuration(_apply_properties_to_dict(self._configuration, self._properties))
 
 
-__all__ = ['DEFAULT_START_SCRIPT_FILENAME', 'Configuration']
+__all__ = ['DEFAULT_START_SCRIPT_FILENAME', 'FrozenDict', 'FrozenList', 'Configuration', 'LazyConfiguration', 'json_file_cache', 'load_json_file']
@@ -1,8 +1,11 @@
 from . import logger
-from .configuration import Configuration
-from .properties import Properties, RAISE_ON_EXISTING
-from .utils import copytree
-import os, os.path, json, shutil, stat
+from .configuration import Configuration, load_json_file
+from .properties import LayeredProperties, RAISE_ON_EXISTING, load_properties_layer
+from .template import is_template_file, load_template_file, rendered_templates
+from .tree import CopiedFile, ExpandedFile, RenderedFile, RenderedTree
+from .utils import walktree
+from collections import namedtuple
+import logging, os, os.path, shutil, stat
 
 
 ENVIRONMENT_KEY='ENVIRONMENT'
@@ -15,37 +18,94 @@ INSTANCE_KEY='INSTANCE'
 
 _REMOTE_DATA_CENTERS = {'AM1': 'AM2', 'AM2': 'AM1', 'AW1': 'AW2', 'AW2': 'AW1', 'EM1': 'EM2', 'EM2': 'EM1', 'AP1': 'AP2', 'AP2': 'AP1'}
 
+_IGNORED_INSTANCE_FILES = shutil.ignore_patterns('app_params.json', '.*')
+_IGNORED_COMMON_FILES = shutil.ignore_patterns('common_params.json', '*.properties', '.*')
 
-def _build_properties_from_files(properties, filenames, common_directory):
+
+DeploymentKey = namedtuple('DeploymentKey', ['environment', 'data_center', 'application', 'stripe', 'instance'])
+
+
+def _properties_filenames(filenames, common_directory):
     if isinstance(filenames, str):
         filenames = [filenames]
 
-    for filename in reversed(filenames):
-        properties.merge_with(Properties().build_from_file(os.path.join(common_directory, filename)))
+    return [os.path.join(common_directory, filename) for filename in filenames]
+
+
+def _root_directory(kwargs):
+    return os.path.abspath(kwargs.get('root', os.getcwd()))
+
+
+def _common_directory(root, kwargs):
+    return os.path.join(root, kwargs.get('common_dir', os.path.join('common', kwargs['environment'], kwargs['data_center'])))
+
+
+def _overrides_directory(root, kwargs):
+    return os.path.join(root, kwargs.get('overrides_dir', os.path.join('overrides', kwargs['application'], kwargs['stripe'], kwargs['instance'])))
+
+
+def _properties_files(common_directory, kwargs):
+    return _properties_filenames(kwargs.get('properties', "%s.properties" % kwargs['application']), common_directory)
+
+
+class DeploymentSpec(object):
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._key = DeploymentKey(*[kwargs[name] for name in DeploymentKey._fields])
+
+    def __str__(self):
+        return "/".join(self.key)
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def kwargs(self):
+        return dict(self._kwargs)
+
+    @property
+    def root(self):
+        return _root_directory(self._kwargs)
+
+    @property
+    def common_directory(self):
+        return _common_directory(self.root, self._kwargs)
+
+    @property
+    def overrides_directory(self):
+        return _overrides_directory(self.root, self._kwargs)
+
+    @property
+    def properties_files(self):
+        return tuple(_properties_files(self.common_directory, self._kwargs))
+
+    def load(self):
+        return Deployment(**self._kwargs)
 
 
 class Deployment(object):
     def __init__(self, **kwargs):
         from .commands.builder import Builder
 
-        properties = Properties()
-        self._common_dir = kwargs.get('common_dir', os.path.join('common', kwargs['environment'], kwargs['data_center']))
-        _build_properties_from_files(properties,
-                kwargs.get('properties', "%s.properties" % kwargs['application']), self.common_directory)
+        self._root = _root_directory(kwargs)
+        self._common_dir = _common_directory(self._root, kwargs)
+        self._properties_files = _properties_files(self._common_dir, kwargs)
+        properties = LayeredProperties(load_properties_layer(self._properties_files))
         properties.save(ENVIRONMENT_KEY, kwargs['environment'], behavior=RAISE_ON_EXISTING)
         properties.save(DATA_CENTER_KEY, kwargs['data_center'], behavior=RAISE_ON_EXISTING)
         properties.save(REMOTE_DATA_CENTER_KEY, _REMOTE_DATA_CENTERS[kwargs['data_center']], behavior=RAISE_ON_EXISTING)
         properties.save(APPLICATION_KEY, kwargs['application'], behavior=RAISE_ON_EXISTING)
         properties.save(STRIPE_KEY, kwargs['stripe'], behavior=RAISE_ON_EXISTING)
         properties.save(INSTANCE_KEY, kwargs['instance'], behavior=RAISE_ON_EXISTING)
-        self._overrides_dir = kwargs.get('overrides_dir', os.path.join('overrides', kwargs['application'], kwargs['stripe'], kwargs['instance']))
+        self._overrides_dir = _overrides_directory(self._root, kwargs)
         self._builders = []
         for builder in kwargs.get('builders', []):
             if not isinstance(builder, Builder):
                 raise TypeError("Any builder must inherit from Builder")
             self._builders.append(builder)
             builder.build_properties(properties)
-        self._properties = properties
+        self._properties = properties.freeze()
 
     def __str__(self):
         return str(self._properties)
@@ -74,6 +134,33 @@ class Deployment(object):
     def instance(self):
         return self.properties[INSTANCE_KEY]
 
+    @property
+    def key(self):
+        return DeploymentKey(self.environment, self.data_center, self.application, self.stripe, self.instance)
+
+    @property
+    def builders(self):
+        return tuple(self._builders)
+
+    @property
+    def properties_files(self):
+        return tuple(self._properties_files)
+
+    @property
+    def configuration_files(self):
+        return (os.path.join(self.common_directory, 'common_params.json'), os.path.join(self.overrides_directory, 'app_params.json'))
+
+    def input_files(self):
+        files = list(self.properties_files)
+        files += [filename for filename in self.configuration_files if os.path.isfile(filename)]
+        files += walktree(self.overrides_directory, ignore=_IGNORED_INSTANCE_FILES)
+        files += walktree(self.common_directory, ignore=_IGNORED_COMMON_FILES)
+        return files
+
+    @property
+    def root(self):
+        return self._root
+
     @property
     def common_directory(self):
         return self._common_dir
@@ -84,7 +171,7 @@ class Deployment(object):
 
     @property
     def output_directory(self):
-        return os.path.join(os.path.abspath(os.getcwd()), "deployments", self.environment, self.data_center, self.application, self.stripe, self.instance)
+        return os.path.join(self.root, "deployments", self.environment, self.data_center, self.application, self.stripe, self.instance)
 
     def _log_configuration(self, msg):
         logger.debug("%s: %s", msg, str(self._configuration))
@@ -94,47 +181,58 @@ class Deployment(object):
         if not hasattr(self, '_configuration'):
             self._configuration = Configuration({'appName': self.stripe})
             self._log_configuration("Initial configration")
-            for filename in [os.path.join(self.common_directory, 'common_params.json'), os.path.join(self.overrides_directory, 'app_params.json')]:
+            for filename in self.configuration_files:
                 try:
-                    with open(filename, 'r') as json_file:
-                        self._configuration = self._configuration.merge_with(json.load(json_file))
+                    self._configuration = self._configuration.merge_with(load_json_file(filename))
                 except FileNotFoundError:
                     logger.info("Skipping %s since it cannot be found.", filename)
                 self._log_configuration("After %s" % filename)
-            self._configuration = self._configuration.apply_properties(self.properties)
-            self._log_configuration("After applying properties")
+            self._configuration = self._configuration.apply_properties_lazily(self.properties)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("After applying properties: %s", str(self._configuration.materialize()))
         return self._configuration
 
-    def create(self):
+    def render(self):
+        return self._render(self._builders)
+
+    def _render(self, builders):
+        tree = RenderedTree()
+        for builder in builders:
+            builder.build(self)
+            tree.update(builder.render(self))
+        self._render_files(tree, self.overrides_directory, _IGNORED_INSTANCE_FILES)
+        self._render_files(tree, self.common_directory, _IGNORED_COMMON_FILES)
+        return tree
+
+    def create(self, max_workers=None):
         self._clean_output_directory()
         for builder in self._builders:
-            builder.build(self)
-            builder.write_to_file(self)
-        self._copy_instance_files()
-        self._copy_common_files()
+            if not builder.renders_in_memory:
+                builder.build(self)
+                builder.write_to_file(self)
+        self._render([builder for builder in self._builders if builder.renders_in_memory]).write_to(self.output_directory, max_workers)
 
     def _clean_output_directory(self):
         if os.path.isdir(self.output_directory):
             shutil.rmtree(self.output_directory)
 
-    def _copy_instance_files(self):
-        self._copy_files(self.overrides_directory, ignore=shutil.ignore_patterns('app_params.json', '.*'))
-
-    def _copy_common_files(self):
-        self._copy_files(self.common_directory, ignore=shutil.ignore_patterns('common_params.json', '*.properties', '.*'))
-
-    def _copy_files(self, source, ignore):
-        if os.path.isdir(source):
-            copytree(source, self.output_directory, ignore=ignore, copy_function=self._copy_file)
-
-    def _copy_file(self, source, destination):
-        with open(source, 'r') as src, open(destination, 'w') as dst:
-            line_no = 1
-            for line in src:
-                try:
-                    dst.write(self.properties.apply_to_value(line))
-                    line_no += 1
-                except KeyError:
-                    logger.error("Failed to copy %s to %s", source, destination)
-                    logger.exception("Failed while applying properties to line %d\n\t%s", line_no, line)
-                    raise
+    def _render_files(self, tree, source, ignore):
+        for filename in walktree(source, ignore=ignore, directories=True):
+            if filename.endswith(os.sep):
+                tree.add_directory(os.path.relpath(filename, source))
+            else:
+                tree[os.path.relpath(filename, source)] = self._render_file(filename)
+
+    def _render_file(self, source):
+        if not is_template_file(source):
+            return CopiedFile(source)
+
+        template_file = load_template_file(source)
+        if template_file is None:
+            return ExpandedFile(source, self.properties)
+
+        try:
+            return RenderedFile(rendered_templates.render(template_file, self.properties))
+        except KeyError:
+            logger.error("Failed to render %s for %s", source, self.output_directory)
+            raise
@@ -0,0 +1,116 @@
+from . import __version__, logger
+from .cache import FileCache, single_entry
+from .utils import hash_file, replace_atomically
+import functools, hashlib, inspect, json, os
+
+
+MANIFEST_VERSION = 1
+FILE_DIGEST_CACHE_ENTRIES = 64 * 1024
+
+
+_file_digest_cache = FileCache(hash_file, FILE_DIGEST_CACHE_ENTRIES, single_entry)
+
+
+def file_digest(filename):
+    return _file_digest_cache.get(filename)
+
+
+def _digest_of_files(filenames):
+    digest = hashlib.sha256()
+    for filename in sorted(set(filenames)):
+        digest.update(file_digest(filename).encode('ascii'))
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def bootstrapper_fingerprint():
+    # Covers upgrades that change how files are rendered even when the version is not bumped
+    package_directory = os.path.dirname(os.path.abspath(__file__))
+    sources = [os.path.join(directory, filename)
+            for (directory, _, filenames) in os.walk(package_directory)
+            for filename in filenames if filename.endswith('.py')]
+    return "%s+%s" % (__version__, _digest_of_files(sources)[:16])
+
+
+def _source_files(cls):
+    for klass in cls.__mro__:
+        try:
+            filename = inspect.getsourcefile(klass)
+        except TypeError:
+            continue
+        if filename is not None and os.path.isfile(filename):
+            yield filename
+
+
+def builder_fingerprint(builder):
+    # The builder's attributes say how it is configured; the source of its class hierarchy says what it does
+    return "%s@%s" % (builder.fingerprint, _digest_of_files(_source_files(builder.__class__))[:16])
+
+
+class DeploymentManifest(object):
+    def __init__(self, key, inputs, builders, bootstrapper=None):
+        self._key = list(key)
+        self._inputs = dict(inputs)
+        self._builders = list(builders)
+        self._bootstrapper = bootstrapper_fingerprint() if bootstrapper is None else bootstrapper
+
+    def __eq__(self, other):
+        return isinstance(other, DeploymentManifest) and self.digest == other.digest
+
+    def __ne__(self, other):
+        return not self == other
+
+    @property
+    def key(self):
+        return tuple(self._key)
+
+    @property
+    def inputs(self):
+        return dict(self._inputs)
+
+    @property
+    def builders(self):
+        return list(self._builders)
+
+    @property
+    def bootstrapper(self):
+        return self._bootstrapper
+
+    def _as_dict(self):
+        return {'version': MANIFEST_VERSION, 'bootstrapper': self._bootstrapper, 'key': self._key, 'inputs': self._inputs, 'builders': self._builders}
+
+    @property
+    def digest(self):
+        return hashlib.sha256(json.dumps(self._as_dict(), sort_keys=True).encode('utf-8')).hexdigest()
+
+    def save(self, filename):
+        directory = os.path.dirname(filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        contents = self._as_dict()
+        contents['digest'] = self.digest
+        with replace_atomically(filename, 'w') as f:
+            json.dump(contents, f, sort_keys=True, indent=2)
+
+
+def build_manifest(deployment):
+    inputs = {os.path.relpath(filename, deployment.root): file_digest(filename) for filename in deployment.input_files()}
+    return DeploymentManifest(deployment.key, inputs, [builder_fingerprint(builder) for builder in deployment.builders])
+
+
+def load_manifest(filename):
+    try:
+        with open(filename, 'r') as f:
+            contents = json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        logger.warning("Ignoring unreadable deployment manifest %s", filename)
+        return None
+
+    if contents.get('version') != MANIFEST_VERSION or 'bootstrapper' not in contents:
+        return None
+    return DeploymentManifest(contents['key'], contents['inputs'], contents['builders'], contents['bootstrapper'])
+
+
+__all__ = ['MANIFEST_VERSION', 'DeploymentManifest', 'file_digest', 'bootstrapper_fingerprint', 'builder_fingerprint', 'build_manifest', 'load_manifest']
@@ -0,0 +1,112 @@
+from . import logger
+from .utils import hash_file
+import errno, fcntl, os, stat
+
+
+HARDLINK = 'hardlink'
+REFLINK = 'reflink'
+LINK_METHODS = (HARDLINK, REFLINK)
+
+_FICLONE = 0x40049409
+_REFLINK_UNSUPPORTED_ERRORS = (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY, errno.EBADF)
+
+
+def _reflink(source, destination):
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+
+
+def _temporary_name(path):
+    return "%s.%d.dedupe" % (path, os.getpid())
+
+
+class ObjectStore(object):
+    def __init__(self, directory, method=HARDLINK):
+        if method not in LINK_METHODS:
+            raise ValueError("Unknown link method '%s' (must be one of %s)" % (method, ", ".join(LINK_METHODS)))
+        self._directory = directory
+        self._method = method
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def method(self):
+        return self._method
+
+    def _object_path(self, digest, mode):
+        return os.path.join(self._directory, digest[:2], "%s-%o" % (digest, mode))
+
+    def store_tree(self, root):
+        saved = 0
+        for (directory, _, filenames) in os.walk(root):
+            for filename in filenames:
+                saved += self.store(os.path.join(directory, filename))
+        return saved
+
+    def store(self, path):
+        status = os.lstat(path)
+        if not stat.S_ISREG(status.st_mode):
+            return 0
+
+        object_path = self._object_path(hash_file(path), stat.S_IMODE(status.st_mode))
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        if self._method == REFLINK:
+            saved = self._reflink(path, object_path, status)
+            if saved is not None:
+                return saved
+        return self._hardlink(path, object_path, status)
+
+    def _hardlink(self, path, object_path, status):
+        try:
+            os.link(path, object_path)
+            return 0
+        except FileExistsError:
+            pass
+
+        if os.stat(object_path).st_ino == status.st_ino:
+            return 0
+        temporary = _temporary_name(path)
+        os.link(object_path, temporary)
+        os.replace(temporary, path)
+        return status.st_size
+
+    def _reflink(self, path, object_path, status):
+        if os.path.exists(object_path):
+            (source, destination, saved) = (object_path, path, status.st_size)
+        else:
+            (source, destination, saved) = (path, object_path, 0)
+
+        temporary = _temporary_name(destination)
+        try:
+            _reflink(source, temporary)
+        except OSError as why:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            if why.errno in _REFLINK_UNSUPPORTED_ERRORS:
+                return None
+            raise
+        os.chmod(temporary, stat.S_IMODE(status.st_mode))
+        os.replace(temporary, destination)
+        return saved
+
+    def collect_garbage(self):
+        removed = 0
+        if not os.path.isdir(self._directory):
+            return removed
+
+        for (directory, _, filenames) in os.walk(self._directory, topdown=False):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                # Reflinked copies do not reference their object, so reflink objects only live for one run
+                if self._method == REFLINK or os.lstat(path).st_nlink <= 1:
+                    os.remove(path)
+                    removed += 1
+            if directory != self._directory and not os.listdir(directory):
+                os.rmdir(directory)
+        logger.debug("Removed %d unreferenced object(s) from %s", removed, self._directory)
+        return removed
+
+
+__all__ = ['HARDLINK', 'REFLINK', 'LINK_METHODS', 'ObjectStore']
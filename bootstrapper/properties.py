@@ -1,14 +1,15 @@
-import os
-import re
+from .cache import FileCache, single_entry
+from .template import compile_template
+from .utils import replace_atomically
+from abc import ABCMeta, abstractmethod
+from collections import ChainMap
+from collections.abc import Mapping, KeysView, ItemsView, ValuesView
 
 
 def _is_set(behavior, bit):
     return (behavior & bit) > 0
 
 
-_parameter_expansion = re.compile(r"\\{0}\$\{([^$}]+)\}")
-
-
 INSERT = 1
 UPDATE = 2
 UPSERT = 3
@@ -36,7 +37,72 @@ MC_NETWORK_DEVICE_KEY = "MC_NETWORK_DEVICE"
 
 
 
-class Properties(dict):
+def _references_of(value):
+    if isinstance(value, str) and '${' in value:
+        return compile_template(value).references
+    return ()
+
+
+def _resolve_property(name, value, resolved, missing):
+    for reference in _references_of(value):
+        if reference in missing:
+            missing[name] = missing[reference]
+            return
+        elif reference not in resolved:
+            missing[name] = reference
+            return
+
+    if _references_of(value):
+        resolved[name] = compile_template(value).render(lambda reference: str(resolved[reference]))
+    else:
+        resolved[name] = value
+
+
+def _resolve_properties(properties, names=None, known=None):
+    if names is None:
+        names = list(properties)
+    own = {}
+    resolved = ChainMap(own, known) if known else own
+    missing = {}
+    for root in names:
+        if (root in resolved) or (root in missing):
+            continue
+        path = [root]
+        pending = [iter(_references_of(properties[root]))]
+        while path:
+            for reference in pending[-1]:
+                if (reference in resolved) or (reference in missing) or (reference not in properties):
+                    continue
+                if reference in path:
+                    cycle = path[path.index(reference):] + [reference]
+                    raise ValueError("Circular reference between properties: %s" % " -> ".join(cycle))
+                path.append(reference)
+                pending.append(iter(_references_of(properties[reference])))
+                break
+            else:
+                name = path.pop()
+                pending.pop()
+                _resolve_property(name, properties[name], resolved, missing)
+    return ({name: own[name] for name in names if name in own}, missing)
+
+
+class _PropertiesExpansion(object, metaclass=ABCMeta):
+    def apply_to_value(self, value):
+        if not isinstance(value, str) or '${' not in value:
+            return value
+        return compile_template(value).render(self._resolve_reference)
+
+    @abstractmethod
+    def _resolve_reference(self, name):
+        raise NotImplementedError()
+
+    def apply_to_file(self, filename):
+        with open(filename, 'r') as template, replace_atomically(filename, 'w') as expanded:
+            for line in template:
+                expanded.write(self.apply_to_value(line))
+
+
+class Properties(_PropertiesExpansion, dict):
     def build_from_file(self, filename, behavior=UPSERT):
         with open(filename, 'r') as f:
             for line in f:
@@ -72,33 +138,139 @@ class Properties(dict):
             return (name, value)
         return (None, None)
 
-    def apply_to_value(self, value):
-        if not isinstance(value, str):
-            return value
+    def _resolve_reference(self, name):
+        return self.apply_to_value(str(self[name]))
 
-        while True:
-            parameter = _parameter_expansion.search(value)
-            if parameter:
-                value = value[:parameter.start()] + str(self[parameter.group(1).strip()]) + value[parameter.end():]
-            else:
-                return value
+    def freeze(self):
+        return FrozenProperties(self)
 
-    def apply_to_file(self, filename):
-        template_contents = self._get_template_content(filename)
-        self._remove_template_file(filename)
-        self._write_expanded_content_back_to_file(template_contents, filename)
 
-    def _get_template_content(self, filename):
-        lines = []
-        with open(filename, 'r') as f:
-            for line in f:
-                lines.append(line)
-        return lines
+class FrozenProperties(_PropertiesExpansion, Mapping):
+    def __init__(self, properties, names=None, parent=None):
+        self._parent = parent if parent is not None else {}
+        (self._values, self._missing) = _resolve_properties(properties, names, self._parent)
+
+    def __getitem__(self, name):
+        if name in self._missing:
+            raise KeyError(self._missing[name])
+        elif name in self._values:
+            return self._values[name]
+        return self._parent[name]
+
+    def __contains__(self, name):
+        return (name in self._values) or (name in self._missing) or (name in self._parent)
+
+    def __iter__(self):
+        yield from self._parent
+        yield from self._values
+        yield from self._missing
+
+    def __len__(self):
+        return len(self._parent) + len(self._values) + len(self._missing)
+
+    def __repr__(self):
+        return repr({**self._parent, **self._values})
+
+    def get(self, name, default=None):
+        if name in self:
+            return self[name]
+        return default
+
+    def _resolve_reference(self, name):
+        return str(self[name])
+
+
+class LayeredProperties(Properties):
+    def __init__(self, base):
+        super(LayeredProperties, self).__init__()
+        self._base = base
+
+    def __missing__(self, name):
+        return self._base[name]
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name) or (name in self._base)
+
+    def __iter__(self):
+        yield from self._base
+        for name in dict.__iter__(self):
+            if name not in self._base:
+                yield name
+
+    def __len__(self):
+        return len(self._base) + sum(1 for name in dict.__iter__(self) if name not in self._base)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def keys(self):
+        return KeysView(self)
+
+    def items(self):
+        return ItemsView(self)
+
+    def values(self):
+        return ValuesView(self)
+
+    def get(self, name, default=None):
+        if name in self:
+            return self[name]
+        return default
+
+    @property
+    def base(self):
+        return self._base
+
+    def freeze(self):
+        if any(name in self._base for name in dict.__iter__(self)):
+            return FrozenProperties(self)
+        (resolved, unresolved) = self._base.resolve()
+        return FrozenProperties(self, list(unresolved) + list(dict.__iter__(self)), resolved)
+
+
+class ParsedProperties(Mapping):
+    def __init__(self, properties):
+        self._properties = dict(properties)
+        self._resolution = None
+
+    def __getitem__(self, name):
+        return self._properties[name]
+
+    def __iter__(self):
+        return iter(self._properties)
+
+    def __len__(self):
+        return len(self._properties)
+
+    def __repr__(self):
+        return repr(self._properties)
+
+    def resolve(self):
+        if self._resolution is None:
+            self._resolution = _resolve_properties(self)
+        return self._resolution
+
+
+def _parse_properties_file(filename):
+    return ParsedProperties(Properties().build_from_file(filename))
+
+
+def _merge_properties_files(*filenames):
+    properties = Properties()
+    for filename in reversed(filenames):
+        properties.merge_with(load_properties_file(filename))
+    return ParsedProperties(properties)
+
+
+PROPERTIES_CACHE_ENTRIES = 1024
+
+_properties_file_cache = FileCache(_parse_properties_file, PROPERTIES_CACHE_ENTRIES, single_entry)
+_properties_layer_cache = FileCache(_merge_properties_files, PROPERTIES_CACHE_ENTRIES, single_entry)
+
+
+def load_properties_file(filename):
+    return _properties_file_cache.get(filename)
 
-    def _remove_template_file(self, filename):
-        os.remove(filename)
 
-    def _write_expanded_content_back_to_file(self, template_contents, filename):
-        with open(filename, 'w') as f:
-            for line in template_contents:
-                f.write('%s' % self.apply_to_value(line))
+def load_properties_layer(filenames):
+    return _properties_layer_cache.get(*filenames)
@@ -0,0 +1,59 @@
+from .deployment import DeploymentKey
+from fnmatch import fnmatchcase
+import hashlib
+
+
+def shard_of(key, count):
+    digest = hashlib.sha256("/".join(key).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count + 1
+
+
+def parse_shard(text):
+    try:
+        (index, count) = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise ValueError("Shard must be given as i/N (got '%s')" % text)
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError("Shard %d/%d is out of range (must be 1 <= i <= N)" % (index, count))
+    return (index, count)
+
+
+class DeploymentSelector(object):
+    def __init__(self, shard=None, **patterns):
+        unknown = set(patterns) - set(DeploymentKey._fields)
+        if unknown:
+            raise ValueError("Unknown deployment key field(s): %s" % ", ".join(sorted(unknown)))
+        self._patterns = {field: pattern for (field, pattern) in patterns.items() if pattern is not None}
+        self._shard = None if shard is None else tuple(shard)
+
+    def __bool__(self):
+        return bool(self._patterns) or self._shard is not None
+
+    def __str__(self):
+        text = "/".join(self._patterns.get(field, '*') for field in DeploymentKey._fields)
+        if self._shard is not None:
+            text += " (shard %d/%d)" % self._shard
+        return text
+
+    @property
+    def patterns(self):
+        return dict(self._patterns)
+
+    @property
+    def shard(self):
+        return self._shard
+
+    def accepts(self, field, value):
+        pattern = self._patterns.get(field)
+        return pattern is None or fnmatchcase(value, pattern)
+
+    def matches(self, key):
+        if self._shard is not None and shard_of(key, self._shard[1]) != self._shard[0]:
+            return False
+        return all(self.accepts(field, value) for (field, value) in zip(DeploymentKey._fields, key))
+
+
+ALL_DEPLOYMENTS = DeploymentSelector()
+
+
+__all__ = ['DeploymentSelector', 'ALL_DEPLOYMENTS', 'shard_of', 'parse_shard']
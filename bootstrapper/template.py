@@ -0,0 +1,180 @@
+from . import logger
+from .cache import FileCache, single_entry
+from collections import OrderedDict
+import functools, hashlib, io, os, re, threading
+
+
+_parameter_expansion = re.compile(r"\$\{([^$}]+)\}")
+
+_COMPILED_TEMPLATE_CACHE_SIZE = 64 * 1024
+
+_TEMPLATE_MARKER = b'${'
+_SCAN_CHUNK_SIZE = 1024 * 1024
+
+MAX_CACHED_TEMPLATE_FILE_SIZE = 4 * 1024 * 1024
+RENDERED_TEMPLATE_CACHE_SIZE = 64 * 1024 * 1024
+TEMPLATE_FILE_CACHE_SIZE = 64 * 1024 * 1024
+TEMPLATE_SCAN_CACHE_ENTRIES = 64 * 1024
+
+
+class Template(object):
+    def __init__(self, text):
+        self._text = text
+        segments = []
+        position = 0
+        for parameter in _parameter_expansion.finditer(text):
+            if parameter.start() > position:
+                segments.append((False, text[position:parameter.start()]))
+            segments.append((True, parameter.group(1).strip()))
+            position = parameter.end()
+        if position < len(text):
+            segments.append((False, text[position:]))
+        self._segments = tuple(segments)
+        self._references = tuple(dict.fromkeys(name for (is_reference, name) in segments if is_reference))
+
+    def __str__(self):
+        return self._text
+
+    @property
+    def text(self):
+        return self._text
+
+    @property
+    def references(self):
+        return self._references
+
+    def render(self, resolve):
+        return ''.join([resolve(segment) if is_reference else segment for (is_reference, segment) in self._segments])
+
+
+@functools.lru_cache(maxsize=_COMPILED_TEMPLATE_CACHE_SIZE)
+def compile_template(text):
+    return Template(text)
+
+
+def _scan_for_template(filename):
+    with open(filename, 'rb') as f:
+        chunk = f.read(_SCAN_CHUNK_SIZE)
+        if b'\0' in chunk:
+            return False
+        previous = b''
+        while chunk:
+            if _TEMPLATE_MARKER in previous + chunk:
+                return True
+            previous = chunk[-1:]
+            chunk = f.read(_SCAN_CHUNK_SIZE)
+    return False
+
+
+# Files under common/ are shared by every deployment of a data center, so each is scanned once per version
+_template_scan_cache = FileCache(_scan_for_template, TEMPLATE_SCAN_CACHE_ENTRIES, single_entry)
+
+
+def is_template_file(filename):
+    return _template_scan_cache.get(filename)
+
+
+class TemplateFile(object):
+    def __init__(self, text):
+        self._lines = tuple(io.StringIO(text))
+        self._size = len(text)
+        self._digest = hashlib.sha256(text.encode('utf-8', 'surrogateescape')).hexdigest()
+        self._references = tuple(dict.fromkeys(name for line in self._lines if '${' in line for name in compile_template(line).references))
+
+    @property
+    def digest(self):
+        return self._digest
+
+    @property
+    def references(self):
+        return self._references
+
+    @property
+    def size(self):
+        return self._size
+
+    def render(self, properties):
+        rendered = []
+        for (line_no, line) in enumerate(self._lines, 1):
+            try:
+                rendered.append(properties.apply_to_value(line))
+            except KeyError:
+                logger.exception("Failed while applying properties to line %d\n\t%s", line_no, line)
+                raise
+        return ''.join(rendered)
+
+
+def _read_template_file(filename):
+    if os.path.getsize(filename) > MAX_CACHED_TEMPLATE_FILE_SIZE:
+        return None
+    with open(filename, 'r') as f:
+        return TemplateFile(f.read())
+
+
+def _template_file_size(template_file):
+    return 0 if template_file is None else template_file.size
+
+
+_template_file_cache = FileCache(_read_template_file, TEMPLATE_FILE_CACHE_SIZE, _template_file_size)
+
+
+def load_template_file(filename):
+    return _template_file_cache.get(filename)
+
+
+class RenderedTemplateCache(object):
+    def __init__(self, max_size=RENDERED_TEMPLATE_CACHE_SIZE):
+        self._max_size = max_size
+        self._size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    def render(self, template_file, properties):
+        try:
+            # Keyed on resolved values: a raw value such as http://${HOST} stays the same when HOST changes
+            key = (template_file.digest,) + tuple(properties.apply_to_value('${%s}' % name) for name in template_file.references)
+        except KeyError:
+            key = None
+        if key is None:
+            return template_file.render(properties)
+
+        with self._lock:
+            contents = self._entries.get(key)
+            if contents is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return contents
+
+        contents = template_file.render(properties)
+        with self._lock:
+            self._misses += 1
+            if len(contents) <= self._max_size and key not in self._entries:
+                self._entries[key] = contents
+                self._size += len(contents)
+                while self._size > self._max_size:
+                    (_, evicted) = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+        return contents
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._hits = 0
+            self._misses = 0
+
+
+rendered_templates = RenderedTemplateCache()
+
+
+__all__ = ['Template', 'TemplateFile', 'RenderedTemplateCache', 'compile_template', 'is_template_file', 'load_template_file', 'rendered_templates']
@@ -0,0 +1,147 @@
+from . import logger
+from .utils import fastcopy
+from concurrent.futures import ThreadPoolExecutor
+import locale, os, stat
+
+
+def _default_file_mode():
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+DEFAULT_FILE_MODE = _default_file_mode()
+EXECUTABLE_FILE_MODE = DEFAULT_FILE_MODE | stat.S_IXUSR
+
+
+def _expand_lines(source, properties):
+    with open(source, 'r') as f:
+        for (line_no, line) in enumerate(f, 1):
+            try:
+                yield properties.apply_to_value(line)
+            except KeyError:
+                logger.exception("Failed while applying properties to %s line %d\n\t%s", source, line_no, line)
+                raise
+
+
+def _encode(text):
+    return text.encode(locale.getpreferredencoding(False))
+
+
+class RenderedFile(object):
+    def __init__(self, text, mode=DEFAULT_FILE_MODE):
+        self._text = text
+        self._mode = mode
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @property
+    def contents(self):
+        return _encode(self._text)
+
+    def write(self, filename):
+        with open(filename, 'wb') as f:
+            f.write(self.contents)
+        os.chmod(filename, self.mode)
+
+
+class CopiedFile(RenderedFile):
+    def __init__(self, source, mode=DEFAULT_FILE_MODE):
+        super(CopiedFile, self).__init__(None, mode)
+        self._source = source
+
+    @property
+    def source(self):
+        return self._source
+
+    @property
+    def contents(self):
+        with open(self._source, 'rb') as f:
+            return f.read()
+
+    def write(self, filename):
+        fastcopy(self._source, filename)
+        os.chmod(filename, self.mode)
+
+
+class ExpandedFile(CopiedFile):
+    def __init__(self, source, properties, mode=DEFAULT_FILE_MODE):
+        super(ExpandedFile, self).__init__(source, mode)
+        self._properties = properties
+
+    @property
+    def contents(self):
+        return _encode(''.join(_expand_lines(self._source, self._properties)))
+
+    def write(self, filename):
+        with open(filename, 'w') as dst:
+            for line in _expand_lines(self._source, self._properties):
+                dst.write(line)
+        os.chmod(filename, self.mode)
+
+
+class CapturedFile(RenderedFile):
+    def __init__(self, contents, mode=DEFAULT_FILE_MODE):
+        super(CapturedFile, self).__init__(None, mode)
+        self._contents = contents
+
+    @property
+    def contents(self):
+        return self._contents
+
+
+def _write_file(item):
+    (filename, rendered_file) = item
+    rendered_file.write(filename)
+
+
+class RenderedTree(dict):
+    def __init__(self, *args, **kwargs):
+        super(RenderedTree, self).__init__(*args, **kwargs)
+        self._directories = set()
+
+    @property
+    def directories(self):
+        return frozenset(self._directories)
+
+    def add_directory(self, path):
+        # Directories are only needed explicitly when they may end up empty; parents of files are always created
+        self._directories.add(path)
+
+    def update(self, *args, **kwargs):
+        super(RenderedTree, self).update(*args, **kwargs)
+        for other in args:
+            if isinstance(other, RenderedTree):
+                self._directories |= other._directories
+
+    def write_to(self, directory, max_workers=None):
+        items = [(os.path.join(directory, path), rendered_file) for (path, rendered_file) in self.items()]
+        directories = set(os.path.dirname(filename) for (filename, _) in items)
+        directories.update(os.path.join(directory, path) for path in self._directories)
+        for parent in sorted(directories):
+            if not os.path.isdir(parent):
+                os.makedirs(parent)
+        if max_workers is not None and max_workers > 1 and len(items) > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for _ in executor.map(_write_file, items):
+                    pass
+        else:
+            for item in items:
+                _write_file(item)
+
+
+def capture_tree(directory):
+    tree = RenderedTree()
+    for (parent, dirnames, filenames) in os.walk(directory):
+        for name in dirnames:
+            tree.add_directory(os.path.relpath(os.path.join(parent, name), directory))
+        for name in filenames:
+            filename = os.path.join(parent, name)
+            with open(filename, 'rb') as f:
+                tree[os.path.relpath(filename, directory)] = CapturedFile(f.read(), stat.S_IMODE(os.stat(filename).st_mode))
+    return tree
+
+
+__all__ = ['DEFAULT_FILE_MODE', 'EXECUTABLE_FILE_MODE', 'RenderedFile', 'CopiedFile', 'ExpandedFile', 'CapturedFile', 'RenderedTree', 'capture_tree']
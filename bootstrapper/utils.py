@@ -1,44 +1,187 @@
-import os
+from . import logger
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import errno, hashlib, os, stat, tempfile
 from shutil import *
 
 
-def copytree(src, dst, symlinks=False, ignore=None, copy_function=copy2):
-    names = os.listdir(src)
+def _preserve_mode_and_ownership(status, filename):
+    os.chmod(filename, stat.S_IMODE(status.st_mode))
+    current = os.stat(filename)
+    if (current.st_uid, current.st_gid) != (status.st_uid, status.st_gid):
+        try:
+            os.chown(filename, status.st_uid, status.st_gid)
+        except PermissionError:
+            logger.warning("Could not preserve ownership %d:%d of %s", status.st_uid, status.st_gid, filename)
+
+
+def _fsync_directory(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def replace_atomically(filename, mode='w'):
+    directory = os.path.dirname(os.path.abspath(filename))
+    try:
+        status = os.stat(filename)
+    except FileNotFoundError:
+        status = None
+
+    fd, temporary_filename = tempfile.mkstemp(dir=directory, prefix='.%s.' % os.path.basename(filename), suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if status is not None:
+            _preserve_mode_and_ownership(status, temporary_filename)
+        os.replace(temporary_filename, filename)
+    except BaseException:
+        if os.path.exists(temporary_filename):
+            os.remove(temporary_filename)
+        raise
+    _fsync_directory(directory)
+
+
+_SIZE_UNITS = (('t', 1024 ** 4), ('g', 1024 ** 3), ('m', 1024 ** 2), ('k', 1024))
+
+
+def parse_size(size):
+    if isinstance(size, int):
+        return size
+    text = str(size).strip().lower()
+    if text.endswith('b') and len(text) > 1 and not text[-2].isdigit():
+        text = text[:-1]
+    multiplier = 1
+    for (suffix, factor) in _SIZE_UNITS:
+        if text.endswith(suffix):
+            (text, multiplier) = (text[:-1], factor)
+            break
+    if not text.isdigit():
+        raise ValueError("Invalid size '%s' (expected a byte count with an optional k, m, g or t suffix)" % size)
+    return int(text) * multiplier
+
+
+def format_size(size):
+    for (suffix, factor) in _SIZE_UNITS:
+        if size >= factor and size % factor == 0:
+            return "%d%s" % (size // factor, suffix)
+    return str(size)
+
+
+def hash_file(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+_COPY_FILE_RANGE_FALLBACK_ERRORS = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.ETXTBSY)
+
+
+def _copy_file_range(fsrc, fdst):
+    while True:
+        copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), 1024 * 1024 * 1024)
+        if copied == 0:
+            return
+
+
+def fastcopy(src, dst):
+    if hasattr(os, 'copy_file_range'):
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            try:
+                _copy_file_range(fsrc, fdst)
+                return dst
+            except OSError as why:
+                if why.errno not in _COPY_FILE_RANGE_FALLBACK_ERRORS:
+                    raise
+    # shutil.copyfile uses sendfile() where the platform supports it
+    return copyfile(src, dst)
+
+
+def walktree(src, ignore=None, directories=False):
+    for (directory, dirnames, filenames) in os.walk(src, followlinks=True):
+        if ignore is not None:
+            ignored_names = ignore(directory, dirnames + filenames)
+            dirnames[:] = [name for name in dirnames if name not in ignored_names]
+            filenames = [name for name in filenames if name not in ignored_names]
+        dirnames.sort()
+        if directories:
+            for name in dirnames:
+                yield os.path.join(directory, name) + os.sep
+        for name in sorted(filenames):
+            yield os.path.join(directory, name)
+
+
+def _scan_tree(src, dst, symlinks, ignore, files, directories, errors):
+    with os.scandir(src) as scanner:
+        entries = list(scanner)
     if ignore is not None:
-        ignored_names = ignore(src, names)
+        ignored_names = ignore(src, [entry.name for entry in entries])
     else:
         ignored_names = set()
 
-    if not os.path.isdir(dst): # This one line does the trick
+    if not os.path.isdir(dst):
         os.makedirs(dst)
-    errors = []
-    for name in names:
-        if name in ignored_names:
+    for entry in entries:
+        if entry.name in ignored_names:
             continue
-        srcname = os.path.join(src, name)
-        dstname = os.path.join(dst, name)
+        dstname = os.path.join(dst, entry.name)
         try:
-            if symlinks and os.path.islink(srcname):
-                linkto = os.readlink(srcname)
-                os.symlink(linkto, dstname)
-            elif os.path.isdir(srcname):
-                copytree(srcname, dstname, symlinks, ignore, copy_function)
+            # DirEntry caches the lstat() from the directory scan, so classifying an entry is free
+            if symlinks and entry.is_symlink():
+                os.symlink(os.readlink(entry.path), dstname)
+            elif entry.is_dir():
+                _scan_tree(entry.path, dstname, symlinks, ignore, files, directories, errors)
             else:
-                # Will raise a SpecialFileError for unsupported file types
-                copy_function(srcname, dstname)
-        # catch the Error from the recursive copytree so that we can
-        # continue with other files
-        except Error as err:
-            errors.extend(err.args[0])
-        except EnvironmentError as why:
-            errors.append((srcname, dstname, str(why)))
+                files.append((entry.path, dstname))
+        except OSError as why:
+            errors.append((entry.path, dstname, str(why)))
+    directories.append((src, dst))
+
+
+def _copy_file(copy_function, srcname, dstname):
     try:
-        copystat(src, dst)
+        # Will raise a SpecialFileError for unsupported file types
+        copy_function(srcname, dstname)
+    except Error as err:
+        return list(err.args[0])
     except OSError as why:
-        if WindowsError is not None and isinstance(why, WindowsError):
+        return [(srcname, dstname, str(why))]
+    return []
+
+
+def copytree(src, dst, symlinks=False, ignore=None, copy_function=copy2, max_workers=None):
+    files = []
+    directories = []
+    errors = []
+    _scan_tree(src, dst, symlinks, ignore, files, directories, errors)
+
+    if max_workers is not None and max_workers > 1 and len(files) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(lambda names: _copy_file(copy_function, *names), files))
+    else:
+        results = [_copy_file(copy_function, srcname, dstname) for (srcname, dstname) in files]
+    for result in results:
+        errors.extend(result)
+
+    # Directories are listed children first and stamped only after every file is in place
+    for (srcname, dstname) in directories:
+        try:
+            copystat(srcname, dstname)
+        except OSError as why:
             # Copying file access times may fail on Windows
-            pass
-        else:
-            errors.extend((src, dst, str(why)))
+            if os.name != 'nt':
+                errors.append((srcname, dstname, str(why)))
     if errors:
         raise Error(errors)
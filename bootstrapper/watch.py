@@ -0,0 +1,228 @@
+from . import logger
+from .cache import file_identity
+from collections import defaultdict
+import ctypes, ctypes.util, errno, os, select, struct, time
+
+
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_WATCH_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF
+
+_INOTIFY_EVENT = struct.Struct('iIII')
+_INOTIFY_BUFFER_SIZE = 64 * 1024
+
+# Editors usually save a file as several events in quick succession; they are reported as one change set
+DEFAULT_SETTLE_TIME = 0.05
+DEFAULT_POLL_INTERVAL = 0.5
+
+
+class DependencyGraph(object):
+    def __init__(self):
+        self._files = defaultdict(set)
+        self._directories = defaultdict(set)
+        self._inputs = {}
+
+    def __contains__(self, key):
+        return key in self._inputs
+
+    @property
+    def keys(self):
+        return set(self._inputs)
+
+    def add(self, key, files, directories):
+        self.remove(key)
+        files = set(os.path.abspath(filename) for filename in files)
+        directories = set(os.path.abspath(directory) for directory in directories)
+        for filename in files:
+            self._files[filename].add(key)
+        for directory in directories:
+            self._directories[directory].add(key)
+        self._inputs[key] = (files, directories)
+
+    def remove(self, key):
+        (files, directories) = self._inputs.pop(key, ((), ()))
+        for (dependents, paths) in ((self._files, files), (self._directories, directories)):
+            for path in paths:
+                dependents[path].discard(key)
+                if not dependents[path]:
+                    del dependents[path]
+
+    def affected_by(self, paths):
+        affected = set()
+        for path in paths:
+            affected |= self._files.get(path, set())
+            directory = path
+            while True:
+                affected |= self._directories.get(directory, set())
+                parent = os.path.dirname(directory)
+                if parent == directory:
+                    break
+                directory = parent
+            # A removed or renamed directory is reported once for everything beneath it
+            prefix = path + os.sep
+            for (directory, keys) in self._directories.items():
+                if directory.startswith(prefix):
+                    affected |= keys
+        return affected
+
+
+def _is_ignored_name(name):
+    # Hidden files, editor backups and the bytecode written when deploy.py is imported never affect a deployment
+    return name.startswith('.') or name.endswith('~') or name == '__pycache__'
+
+
+def _watched_directories(root, excluded):
+    for (directory, names, _) in os.walk(root):
+        names[:] = [name for name in names if not _is_ignored_name(name) and os.path.join(directory, name) not in excluded]
+        yield directory
+
+
+class _Watcher(object):
+    def __init__(self, root, excluded=()):
+        self._root = os.path.abspath(root)
+        self._excluded = set(os.path.abspath(directory) for directory in excluded)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def root(self):
+        return self._root
+
+    def _is_relevant(self, path):
+        if any(_is_ignored_name(name) for name in os.path.relpath(path, self._root).split(os.sep)):
+            return False
+        return not any(path == directory or path.startswith(directory + os.sep) for directory in self._excluded)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(_Watcher):
+    name = 'inotify'
+
+    def __init__(self, root, excluded=(), settle_time=DEFAULT_SETTLE_TIME):
+        super(InotifyWatcher, self).__init__(root, excluded)
+        self._settle_time = settle_time
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._directories = {}
+        try:
+            self._add_tree(self._root)
+        except Exception:
+            self.close()
+            raise
+
+    def _add_tree(self, root):
+        for directory in _watched_directories(root, self._excluded):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _IN_WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOENT:
+                    continue
+                raise OSError(error, "inotify_add_watch failed for %s" % directory)
+            self._directories[wd] = directory
+
+    def _read_events(self):
+        changed = set()
+        while True:
+            try:
+                buffer = os.read(self._fd, _INOTIFY_BUFFER_SIZE)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(buffer):
+                (wd, mask, _, length) = _INOTIFY_EVENT.unpack_from(buffer, offset)
+                offset += _INOTIFY_EVENT.size
+                name = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & _IN_Q_OVERFLOW:
+                    logger.warning("inotify queue overflowed; treating every watched file as changed")
+                    changed.add(self._root)
+                    continue
+                if mask & _IN_IGNORED:
+                    self._directories.pop(wd, None)
+                    continue
+                directory = self._directories.get(wd)
+                if directory is None:
+                    continue
+                path = os.path.join(directory, name) if name else directory
+                if not self._is_relevant(path):
+                    continue
+                if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                    self._add_tree(path)
+                changed.add(path)
+
+    def wait(self, timeout=None):
+        (readable, _, _) = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed = self._read_events()
+        while select.select([self._fd], [], [], self._settle_time)[0]:
+            changed |= self._read_events()
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher(_Watcher):
+    name = 'polling'
+
+    def __init__(self, root, excluded=(), interval=DEFAULT_POLL_INTERVAL):
+        super(PollingWatcher, self).__init__(root, excluded)
+        self._interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for directory in _watched_directories(self._root, self._excluded):
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if not self._is_relevant(path):
+                    continue
+                try:
+                    # A directory's own changes show up as its entries changing; only its presence matters
+                    snapshot[path] = None if os.path.isdir(path) else file_identity(path)
+                except FileNotFoundError:
+                    pass
+        return snapshot
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            changed = (set(snapshot) ^ set(self._snapshot)) | set(path for path in snapshot if path in self._snapshot and snapshot[path] != self._snapshot[path])
+            self._snapshot = snapshot
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            time.sleep(self._interval)
+
+
+def create_watcher(root, excluded=()):
+    try:
+        return InotifyWatcher(root, excluded)
+    except (AttributeError, OSError) as why:
+        logger.info("Falling back to polling for changes under %s (%s)", root, why)
+        return PollingWatcher(root, excluded)
+
+
+__all__ = ['DependencyGraph', 'InotifyWatcher', 'PollingWatcher', 'create_watcher']
@@ -1,54 +1,85 @@
-import json, importlib.util, os.path, os, shutil
-from bootstrapper.deployment import Deployment
+import json, importlib.util, os.path, os, shutil, sys
+from collections import OrderedDict
+from bootstrapper import logger
+from bootstrapper.deployment import DeploymentSpec
+from bootstrapper.selector import ALL_DEPLOYMENTS
 
 
 _DEPLOY_PY = 'deploy.py'
 _DEPLOY_JSON = 'deploy.json'
 
 
-def _load_deployments_from_module(directory):
+def _index_deployments_from_module(directory):
     return getattr(_load_deployment_module(directory), 'deployments')
 
 
-def _load_deployments_from_json(directory):
-    deployments = []
+def _index_deployments_from_json(directory):
+    specs = []
     with open(os.path.join(directory, _DEPLOY_JSON), 'r') as json_file:
         for d in json.load(json_file):
-            deployments.append(Deployment(**d))
-    return deployments
+            d.setdefault('root', directory)
+            specs.append(DeploymentSpec(**d))
+    return specs
 
 
-def _load_deployments_from_directory(directory):
-    deployments = []
-    for environment in os.listdir(os.path.join(directory, 'common')):
-        for data_center in os.listdir(os.path.join(directory, 'common', environment)):
+def _selected_entries(directory, field, selector):
+    return [name for name in os.listdir(directory) if selector.accepts(field, name)]
+
+
+def _index_deployments_from_directory(directory, selector=ALL_DEPLOYMENTS):
+    specs = []
+    for environment in _selected_entries(os.path.join(directory, 'common'), 'environment', selector):
+        for data_center in _selected_entries(os.path.join(directory, 'common', environment), 'data_center', selector):
             properties = []
             for properties_file in os.listdir(os.path.join(directory, 'common', environment, data_center)):
                 if properties_file.endswith(".properties"):
                     properties.append(os.path.join(directory, 'common', environment, data_center, properties_file))
-            for application in os.listdir(os.path.join(directory, 'overrides')):
-                for stripe in os.listdir(os.path.join(directory, 'overrides', application)):
-                    for instance in os.listdir(os.path.join(directory, 'overrides', application, stripe)):
-                        deployments.append(Deployment(
+            for application in _selected_entries(os.path.join(directory, 'overrides'), 'application', selector):
+                for stripe in _selected_entries(os.path.join(directory, 'overrides', application), 'stripe', selector):
+                    for instance in _selected_entries(os.path.join(directory, 'overrides', application, stripe), 'instance', selector):
+                        specs.append(DeploymentSpec(
                             environment=environment,
                             data_center=data_center,
                             application=application,
                             stripe=stripe,
                             instance=instance,
-                            properties=properties))
-    return deployments
+                            properties=properties,
+                            root=directory))
+    return specs
 
 
-def _load_deployments(directory=os.getcwd()):
+def _index_deployments(directory=os.getcwd(), selector=ALL_DEPLOYMENTS):
     if os.path.exists(os.path.join(directory, _DEPLOY_PY)):
-        return _load_deployments_from_module(directory)
+        entries = _index_deployments_from_module(directory)
     elif os.path.exists(os.path.join(directory, _DEPLOY_JSON)):
-        return _load_deployments_from_json(directory)
+        entries = _index_deployments_from_json(directory)
     elif os.path.isdir(os.path.join(directory, 'common')) and os.path.isdir(os.path.join(directory, 'overrides')):
-        return _load_deployments_from_directory(directory)
+        entries = _index_deployments_from_directory(directory, selector)
     else:
         raise RuntimeError("Could not load a deployments the bootstrapper could not find either '%s', '%s', or 'common' and 'overrides' directories." % (_DEPLOY_PY, _DEPLOY_JSON))
 
+    index = OrderedDict()
+    for entry in entries:
+        if isinstance(entry, dict):
+            entry = DeploymentSpec(**dict({'root': directory}, **entry))
+        if not selector.matches(entry.key):
+            continue
+        if entry.key in index:
+            logger.warning("Deployment %s is defined more than once; using the last definition", "/".join(entry.key))
+        index[entry.key] = entry
+    return index
+
+
+def _load_deployment(entry):
+    if isinstance(entry, DeploymentSpec):
+        return entry.load()
+    return entry
+
+
+def _load_deployments(directory=os.getcwd(), selector=ALL_DEPLOYMENTS):
+    for entry in _index_deployments(directory, selector).values():
+        yield _load_deployment(entry)
+
 
 def _load_deployment_module(directory=os.getcwd()):
     deploy_py_filename = os.path.join(directory, _DEPLOY_PY)
@@ -56,17 +87,23 @@ def _load_deployment_module(directory=os.getcwd()):
     if spec is None:
         raise Exception("Found '%s' but failed to load module", deploy_py_filename)
 
+    from .deploy import work_in_directory
     module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
+    sys.modules[spec.name] = module
+    with work_in_directory(directory):
+        spec.loader.exec_module(module)
     return module
 
 
 def add_commands(command_parser):
     from .deploy import add_command as add_deploy_command
-    add_deploy_command(command_parser.add_parser('deploy', help='Builds the deployments'), _load_deployments)
+    add_deploy_command(command_parser.add_parser('deploy', help='Builds the deployments'), _index_deployments, _load_deployment)
+
+    from .merge import add_command as add_merge_command
+    add_merge_command(command_parser.add_parser('merge', help='Assembles the deployments created by sharded deploys'), _index_deployments)
 
     from .run import add_command as add_run_command
-    add_run_command(command_parser.add_parser('run', help='Executes a deployment'), _load_deployments)
+    add_run_command(command_parser.add_parser('run', help='Executes a deployment'), _index_deployments, _load_deployment)
 
     from .stop import add_command as add_stop_command
     add_stop_command(command_parser.add_parser('stop', help='Stops a running process'), _load_deployments)
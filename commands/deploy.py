@@ -1,9 +1,32 @@
+import argparse
 import json
 import importlib.util
 import os.path
 import os
 import shutil
 import contextlib
+import subprocess
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from bootstrapper import logger
+from bootstrapper.configuration import json_file_cache
+from bootstrapper.deployment import DeploymentKey
+from bootstrapper.manifest import build_manifest, load_manifest
+from bootstrapper.objects import LINK_METHODS, ObjectStore
+from bootstrapper.selector import DeploymentSelector, parse_shard
+from bootstrapper.utils import replace_atomically
+from bootstrapper.watch import DependencyGraph, create_watcher
+from . import _DEPLOY_PY, _DEPLOY_JSON
+from bootstrapper.template import rendered_templates
+
+
+_DEPLOYMENTS_DIRECTORY = 'deployments'
+_MANIFESTS_DIRECTORY = '.manifests'
+_OBJECTS_DIRECTORY = '.objects'
+_SHARDS_DIRECTORY = '.shards'
+_MANIFEST_SUFFIX = '.json'
+_IN_FLIGHT_PER_JOB = 2
+
 
 @contextlib.contextmanager
 def work_in_directory(directory):
@@ -15,24 +38,305 @@ def work_in_directory(directory):
         os.chdir(current_directory)
 
 
+def _manifest_filename(deployments_directory, key):
+    return os.path.join(deployments_directory, _MANIFESTS_DIRECTORY, *key) + _MANIFEST_SUFFIX
+
+
+def _shard_manifest_filename(deployments_directory, shard):
+    return os.path.join(deployments_directory, _SHARDS_DIRECTORY, "%d-of-%d%s" % (shard + (_MANIFEST_SUFFIX,)))
+
+
+def _clear_shard_manifests(deployments_directory):
+    # A previous run may have used a different shard count; merge must only ever see this run's manifest
+    shutil.rmtree(os.path.join(deployments_directory, _SHARDS_DIRECTORY), ignore_errors=True)
+
+
+def _save_shard_manifest(deployments_directory, selector, keys):
+    filename = _shard_manifest_filename(deployments_directory, selector.shard)
+    directory = os.path.dirname(filename)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    contents = {'shard': list(selector.shard), 'patterns': selector.patterns, 'deployments': sorted(list(key) for key in keys)}
+    with replace_atomically(filename, 'w') as f:
+        json.dump(contents, f, sort_keys=True, indent=2)
+
+
+def _find_entries(directory, depth):
+    if not os.path.isdir(directory):
+        return
+    for name in sorted(os.listdir(directory)):
+        if name.startswith('.'):
+            continue
+        if depth == 1:
+            yield (name,)
+        else:
+            for names in _find_entries(os.path.join(directory, name), depth - 1):
+                yield (name,) + names
+
+
+def _existing_outputs(deployments_directory):
+    return set(DeploymentKey(*names) for names in _find_entries(deployments_directory, len(DeploymentKey._fields))
+            if os.path.isdir(os.path.join(deployments_directory, *names)))
+
+
+def _existing_manifests(deployments_directory):
+    return set(DeploymentKey(*(names[:-1] + (names[-1][:-len(_MANIFEST_SUFFIX)],)))
+            for names in _find_entries(os.path.join(deployments_directory, _MANIFESTS_DIRECTORY), len(DeploymentKey._fields))
+            if names[-1].endswith(_MANIFEST_SUFFIX))
+
+
+def _remove_empty_parents(path, root):
+    path = os.path.dirname(path)
+    while os.path.abspath(path) != os.path.abspath(root) and os.path.isdir(path) and not os.listdir(path):
+        os.rmdir(path)
+        path = os.path.dirname(path)
+
+
+def _remove_manifest(deployments_directory, key):
+    filename = _manifest_filename(deployments_directory, key)
+    if os.path.exists(filename):
+        os.remove(filename)
+        _remove_empty_parents(filename, os.path.join(deployments_directory, _MANIFESTS_DIRECTORY))
+
+
+def _remove_output(deployments_directory, key):
+    directory = os.path.join(deployments_directory, *key)
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+        _remove_empty_parents(directory, deployments_directory)
+
+
+def _create_deployment(deployment, object_store=None, io_threads=None):
+    deployment.create(io_threads)
+    if object_store is not None:
+        return object_store.store_tree(deployment.output_directory)
+    return 0
+
+
+def _format_errors(errors, total):
+    lines = ["Failed to create %d of %d deployment(s):" % (len(errors), total)]
+    for (key, error) in sorted(errors, key=lambda e: e[0]):
+        lines.append("  %s: %s: %s" % ("/".join(key), error.__class__.__name__, error))
+    return "\n".join(lines)
+
+
+def _changed_files(root, revision):
+    # Generated deployments (and their manifests) are often committed or left untracked; they are outputs, not inputs
+    output_directory = os.path.join(root, _DEPLOYMENTS_DIRECTORY) + os.sep
+    changed = set()
+    for arguments in (['diff', '--name-only', '--no-renames', '--relative', '-z', revision, '--'], ['ls-files', '--others', '--exclude-standard', '-z']):
+        result = subprocess.run(['git', '-C', root] + arguments, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        if result.returncode != 0:
+            raise RuntimeError("Failed to list the files changed since %s: %s" % (revision, result.stderr.strip()))
+        changed.update(os.path.join(root, name) for name in result.stdout.split('\0') if name)
+    return set(path for path in changed if not path.startswith(output_directory))
+
+
+def _affected_keys(index, root, changed):
+    if any(os.path.dirname(path) == root and os.path.basename(path) in (_DEPLOY_PY, _DEPLOY_JSON) for path in changed):
+        return set(index)
+    affected = set()
+    for (key, entry) in index.items():
+        directories = (entry.common_directory + os.sep, entry.overrides_directory + os.sep)
+        properties_files = set(entry.properties_files)
+        if any(path in properties_files or path.startswith(directories) for path in changed):
+            affected.add(key)
+    return affected
+
+
+def _track_inputs(deployments, graph):
+    for deployment in deployments:
+        directories = [deployment.common_directory, deployment.overrides_directory]
+        directories += [os.path.dirname(filename) for filename in deployment.properties_files]
+        graph.add(deployment.key, deployment.input_files(), directories)
+        yield deployment
+
+
 class DeploymentGenerator(object):
-    def __init__(self, deployment_loader):
-        self._load_deployments = deployment_loader
+    def __init__(self, deployment_indexer, deployment_loader):
+        self._index_deployments = deployment_indexer
+        self._load_deployment = deployment_loader
+
+    def _load_deployments(self, index, keys=None):
+        for key in (index if keys is None else sorted(keys)):
+            yield self._load_deployment(index[key])
 
     def run(self, args):
         if not os.path.isdir(args.path):
             raise NotADirectoryError("Directory '%s' does not exist." % args.path)
+        if args.jobs < 1:
+            raise ValueError("--jobs must be a positive integer (got %d)" % args.jobs)
+        if args.io_threads < 1:
+            raise ValueError("--io-threads must be a positive integer (got %d)" % args.io_threads)
+        self._io_threads = args.io_threads
+        if args.watch and (args.shard is not None or args.changed_since is not None):
+            raise ValueError("--watch cannot be combined with --shard or --changed-since")
 
-        if os.path.isdir(os.path.join(args.path, 'deployments')):
-            shutil.rmtree(os.path.join(args.path, 'deployments'))
+        deployments_directory = os.path.join(os.path.abspath(args.path), _DEPLOYMENTS_DIRECTORY)
+        object_store = None
+        if args.dedupe:
+            object_store = ObjectStore(os.path.join(deployments_directory, _OBJECTS_DIRECTORY), args.dedupe)
+        selector = DeploymentSelector(shard=args.shard, **{field: getattr(args, field) for field in DeploymentKey._fields})
+        if selector:
+            logger.info("Only creating deployments matching %s", selector)
+        _clear_shard_manifests(deployments_directory)
+        index = self._index_deployments(args.path, selector)
+        keys = set(index)
+        affected = None
+        if args.changed_since is not None:
+            changed = _changed_files(os.path.abspath(args.path), args.changed_since)
+            affected = _affected_keys(index, os.path.abspath(args.path), changed)
+            logger.info("%d file(s) changed since %s affecting %d of %d deployment(s)", len(changed), args.changed_since, len(affected), len(index))
+        graph = DependencyGraph()
+        deployments = self._load_deployments(index, affected)
+        if args.watch:
+            deployments = _track_inputs(deployments, graph)
+        (_, pending, errors, saved) = self._create_deployments(
+                deployments, deployments_directory, args.jobs, args.force, object_store)
+        removed = self._remove_stale_deployments(keys, deployments_directory, selector)
+        if selector.shard is not None:
+            _save_shard_manifest(deployments_directory, selector, keys - set(key for (key, _) in errors))
+        if object_store is not None:
+            object_store.collect_garbage()
+            logger.info("Deduplicated generated files (%s mode), saving %d bytes", object_store.method, saved)
+        logger.info("Created %d deployment(s), %d unchanged, %d stale removed",
+                pending - len(errors), len(keys) - pending, removed)
+        logger.debug("JSON file cache: %d hits, %d misses", json_file_cache.hits, json_file_cache.misses)
+        logger.debug("Rendered template cache: %d hits, %d misses", rendered_templates.hits, rendered_templates.misses)
+        if args.watch:
+            self._watch(args.path, deployments_directory, selector, object_store, graph)
+        elif errors:
+            raise RuntimeError(_format_errors(errors, pending))
 
-        deployments = self._load_deployments(args.path)
-        with work_in_directory(args.path):
+    def _watch(self, path, deployments_directory, selector, object_store, graph):
+        root = os.path.abspath(path)
+        with create_watcher(root, excluded=[deployments_directory]) as watcher:
+            print("Watching %s for changes (%s); press Ctrl-C to stop" % (root, watcher.name))
+            try:
+                while True:
+                    changed = watcher.wait()
+                    started = time.monotonic()
+                    (created, errors) = self._update_deployments(root, changed, deployments_directory, selector, object_store, graph)
+                    if object_store is not None:
+                        object_store.collect_garbage()
+                    print("%d file(s) changed: recreated %d deployment(s) in %.3fs%s" % (len(changed), created, time.monotonic() - started,
+                            ", %d failed" % len(errors) if errors else ""))
+            except KeyboardInterrupt:
+                pass
+
+    def _update_deployments(self, root, changed, deployments_directory, selector, object_store, graph):
+        index_changed = any(os.path.dirname(path) == root and os.path.basename(path) in (_DEPLOY_PY, _DEPLOY_JSON) for path in changed)
+        try:
+            index = self._index_deployments(root, selector)
+        except Exception:
+            logger.exception("Failed to load the deployments in %s", root)
+            return (0, [])
+
+        keys = set(index)
+        for key in sorted(graph.keys - keys):
+            logger.info("Removing deployment %s", "/".join(key))
+            graph.remove(key)
+            _remove_output(deployments_directory, key)
+            _remove_manifest(deployments_directory, key)
+
+        affected = keys if index_changed else (graph.affected_by(changed) | (keys - graph.keys)) & keys
+        deployments = _track_inputs(self._load_deployments(index, affected), graph)
+        (_, pending, errors, _) = self._create_deployments(deployments, deployments_directory, 1, False, object_store)
+        return (pending - len(errors), errors)
+
+    def _outdated_manifest(self, deployment, deployments_directory, force):
+        manifest = build_manifest(deployment)
+        manifest_filename = _manifest_filename(deployments_directory, deployment.key)
+        if not force and manifest == load_manifest(manifest_filename) and os.path.isdir(deployment.output_directory):
+            logger.debug("Skipping %s since its inputs have not changed", "/".join(deployment.key))
+            return None
+        _remove_manifest(deployments_directory, deployment.key)
+        return manifest
+
+    def _create_deployments(self, deployments, deployments_directory, jobs, force, object_store):
+        # Deployments are consumed one at a time and dropped once created so that memory stays flat
+        # no matter how many the loader yields; with a pool at most _IN_FLIGHT_PER_JOB * jobs are pending.
+        keys = set()
+        pending = 0
+        errors = []
+        saved = 0
+        executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+        try:
+            in_flight = {}
             for deployment in deployments:
-                deployment.create()
+                keys.add(deployment.key)
+                manifest = self._outdated_manifest(deployment, deployments_directory, force)
+                if manifest is None:
+                    continue
+                pending += 1
+                if executor is None:
+                    try:
+                        saved += _create_deployment(deployment, object_store, self._io_threads)
+                        error = None
+                    except Exception as e:
+                        error = e
+                    self._finish_deployment(deployment.key, manifest, deployments_directory, error, errors)
+                else:
+                    if len(in_flight) >= _IN_FLIGHT_PER_JOB * jobs:
+                        saved += self._wait_for_deployments(in_flight, FIRST_COMPLETED, deployments_directory, errors)
+                    in_flight[executor.submit(_create_deployment, deployment, object_store, self._io_threads)] = (deployment.key, manifest)
+            if in_flight:
+                saved += self._wait_for_deployments(in_flight, ALL_COMPLETED, deployments_directory, errors)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return (keys, pending, errors, saved)
+
+    def _wait_for_deployments(self, in_flight, return_when, deployments_directory, errors):
+        saved = 0
+        (done, _) = wait(in_flight, return_when=return_when)
+        for future in done:
+            (key, manifest) = in_flight.pop(future)
+            error = future.exception()
+            if error is None:
+                saved += future.result()
+            self._finish_deployment(key, manifest, deployments_directory, error, errors)
+        return saved
+
+    def _finish_deployment(self, key, manifest, deployments_directory, error, errors):
+        if error is None:
+            manifest.save(_manifest_filename(deployments_directory, key))
+        else:
+            logger.error("Failed to create deployment %s", "/".join(key), exc_info=error)
+            errors.append((key, error))
+
+    def _remove_stale_deployments(self, keys, deployments_directory, selector):
+        existing = _existing_outputs(deployments_directory) | _existing_manifests(deployments_directory)
+        stale = set(key for key in existing if selector.matches(key)) - keys
+        for key in sorted(stale):
+            logger.info("Removing stale deployment %s", "/".join(key))
+            _remove_output(deployments_directory, key)
+            _remove_manifest(deployments_directory, key)
+        return len(stale)
+
+
+def _shard_argument(text):
+    # argparse reports a ValueError from a type= function without its message
+    try:
+        return parse_shard(text)
+    except ValueError as why:
+        raise argparse.ArgumentTypeError(str(why))
 
 
-def add_command(deploy_command, deployment_loader):
-    generator = DeploymentGenerator(deployment_loader)
+def add_command(deploy_command, deployment_indexer, deployment_loader):
+    generator = DeploymentGenerator(deployment_indexer, deployment_loader)
     deploy_command.add_argument('--path', '-p', default=os.getcwd())
+    deploy_command.add_argument('--force', '-f', action='store_true', help='Regenerates every deployment even if its inputs have not changed')
+    deploy_command.add_argument('--jobs', '-j', type=int, default=1, help='Number of deployments to create concurrently in separate processes')
+    deploy_command.add_argument('--changed-since', metavar='REVISION', help='Only creates the deployments whose inputs differ from the given git revision')
+    deploy_command.add_argument('--watch', '-w', action='store_true', help='Keeps running after the initial deploy and recreates the deployments affected by each change to their inputs')
+    deploy_command.add_argument('--io-threads', type=int, default=1, help='Number of threads each deployment uses to write its files')
+    deploy_command.add_argument('--dedupe', choices=LINK_METHODS, help='Stores identical generated files once under deployments/.objects and links them into each deployment')
+    selector_group = deploy_command.add_argument_group('selectors', 'Restrict the deployments created (and the stale outputs removed) to those matching glob patterns')
+    selector_group.add_argument('--environment', metavar='GLOB')
+    selector_group.add_argument('--data-center', metavar='GLOB')
+    selector_group.add_argument('--application', metavar='GLOB')
+    selector_group.add_argument('--stripe', metavar='GLOB')
+    selector_group.add_argument('--instance', metavar='GLOB')
+    selector_group.add_argument('--shard', metavar='i/N', type=_shard_argument, help='Only creates the deployments assigned to shard i of N (1-based) and records them under deployments/.shards for merge')
     deploy_command.set_defaults(callback=generator.run)
@@ -0,0 +1,105 @@
+import json
+import os
+import os.path
+import shutil
+from bootstrapper import logger
+from bootstrapper.deployment import DeploymentKey
+from bootstrapper.selector import DeploymentSelector, shard_of
+from bootstrapper.utils import copytree
+from .deploy import _DEPLOYMENTS_DIRECTORY, _SHARDS_DIRECTORY, _manifest_filename, _remove_manifest, _remove_output, \
+        _existing_outputs, _existing_manifests
+
+
+def _load_shard_manifests(source):
+    shards_directory = os.path.join(source, _SHARDS_DIRECTORY)
+    if not os.path.isdir(shards_directory):
+        raise FileNotFoundError("'%s' does not contain any shard manifests (expected %s)" % (source, shards_directory))
+    for filename in sorted(os.listdir(shards_directory)):
+        with open(os.path.join(shards_directory, filename), 'r') as f:
+            yield json.load(f)
+
+
+def _format_keys(keys):
+    return "\n".join("  %s" % "/".join(key) for key in sorted(keys))
+
+
+class DeploymentMerger(object):
+    def __init__(self, deployment_indexer):
+        self._index_deployments = deployment_indexer
+
+    def run(self, args):
+        if not os.path.isdir(args.path):
+            raise NotADirectoryError("Directory '%s' does not exist." % args.path)
+
+        deployments_directory = os.path.join(os.path.abspath(args.path), _DEPLOYMENTS_DIRECTORY)
+        for source in args.shards:
+            if os.path.realpath(source) == os.path.realpath(deployments_directory):
+                raise ValueError("Shard directory '%s' is the merge target %s; shards must be created in a separate checkout" % (source, deployments_directory))
+
+        (count, patterns, shards) = self._collect_shards(args.shards)
+        selector = DeploymentSelector(**patterns)
+        self._verify_coverage(shards, count, set(self._index_deployments(args.path, selector)))
+
+        keys = set()
+        for (index, (source, shard_keys)) in sorted(shards.items()):
+            for key in sorted(shard_keys):
+                self._merge_deployment(source, deployments_directory, key)
+            keys |= shard_keys
+            logger.info("Merged %d deployment(s) from shard %d/%d (%s)", len(shard_keys), index, count, source)
+
+        stale = set(key for key in _existing_outputs(deployments_directory) | _existing_manifests(deployments_directory) if selector.matches(key)) - keys
+        for key in sorted(stale):
+            logger.info("Removing stale deployment %s", "/".join(key))
+            _remove_output(deployments_directory, key)
+            _remove_manifest(deployments_directory, key)
+
+    def _collect_shards(self, sources):
+        count = None
+        patterns = None
+        shards = {}
+        for source in sources:
+            for contents in _load_shard_manifests(source):
+                (index, shard_count) = contents['shard']
+                if count is None:
+                    (count, patterns) = (shard_count, contents['patterns'])
+                elif shard_count != count or contents['patterns'] != patterns:
+                    raise ValueError("Shard %d/%d in %s was created with a different shard count or selection than the others" % (index, shard_count, source))
+                if index in shards:
+                    raise ValueError("Shard %d/%d is present in both %s and %s" % (index, count, shards[index][0], source))
+                shards[index] = (source, set(DeploymentKey(*key) for key in contents['deployments']))
+        if count is None:
+            raise ValueError("No shard manifests were found")
+        missing = sorted(set(range(1, count + 1)) - set(shards))
+        if missing:
+            raise ValueError("Missing shard(s) %s of %d" % (", ".join(str(index) for index in missing), count))
+        return (count, patterns, shards)
+
+    def _verify_coverage(self, shards, count, expected):
+        for (index, (source, keys)) in shards.items():
+            misplaced = set(key for key in keys if shard_of(key, count) != index)
+            if misplaced:
+                raise ValueError("Shard %d/%d in %s contains deployments assigned to other shards:\n%s" % (index, count, source, _format_keys(misplaced)))
+        covered = set()
+        for (_, keys) in shards.values():
+            covered |= keys
+        if covered != expected:
+            lines = ["Shards do not cover the deployments exactly:"]
+            if expected - covered:
+                lines.append("missing:\n%s" % _format_keys(expected - covered))
+            if covered - expected:
+                lines.append("unknown:\n%s" % _format_keys(covered - expected))
+            raise ValueError("\n".join(lines))
+
+    def _merge_deployment(self, source, deployments_directory, key):
+        _remove_output(deployments_directory, key)
+        copytree(os.path.join(source, *key), os.path.join(deployments_directory, *key), symlinks=True)
+        manifest_filename = _manifest_filename(deployments_directory, key)
+        os.makedirs(os.path.dirname(manifest_filename), exist_ok=True)
+        shutil.copy2(_manifest_filename(source, key), manifest_filename)
+
+
+def add_command(merge_command, deployment_indexer):
+    merger = DeploymentMerger(deployment_indexer)
+    merge_command.add_argument('--path', '-p', default=os.getcwd())
+    merge_command.add_argument('shards', nargs='+', metavar='SHARD', help="A deployments directory created by 'deploy --shard'")
+    merge_command.set_defaults(callback=merger.run)
@@ -1,5 +1,7 @@
 from bootstrapper import RUN_DIRECTORY_KEY
 from bootstrapper.location import Location, ENVIRONMENT_TABLE, DATA_CENTER_TABLE
+from bootstrapper.deployment import DeploymentKey
+from bootstrapper.utils import copytree
 from bootstrapper.commands import CommandBuilder, DockerCommandBuilder, PlatformCommandBuilder
 from tempfile import TemporaryDirectory, TemporaryFile
 from contextlib import contextmanager
@@ -25,17 +27,6 @@ def _get_local_ip_address(netinfo_url):
         s.close()
 
 
-def _find_deployment(deployments, location, application, stripe, instance):
-    for deployment in deployments:
-        if deployment.environment == location.environment and \
-                deployment.data_center == location.data_center and \
-                deployment.application == application and \
-                deployment.stripe == stripe and \
-                deployment.instance == instance:
-                    return deployment
-    return None
-
-
 @contextmanager
 def _change_directory(directory):
     current_dir = os.getcwd()
@@ -49,9 +40,12 @@ def _change_directory(directory):
 class DeploymentRunner(object):
     def __init__(self):
         self._command_builders = {}
-        self._load_deployments = None
+        self._index_deployments = None
+        self._load_deployment = None
 
     def run(self, args):
+        if args.io_threads < 1:
+            raise ValueError("--io-threads must be a positive integer (got %d)" % args.io_threads)
         self._args = args
         self._determine_location()
         self._pull_deployment_info()
@@ -137,7 +131,7 @@ class DeploymentRunner(object):
             source_pathname = os.path.join(self._source_directory, path)
             target_pathname = os.path.join(self.run_directory, path)
             if os.path.isdir(source_pathname):
-                shutil.copytree(source_pathname, target_pathname)
+                copytree(source_pathname, target_pathname, max_workers=self._args.io_threads)
             else:
                 shutil.copy(source_pathname, target_pathname)
 
@@ -218,16 +212,16 @@ class DeploymentRunner(object):
                 subprocess.run(['git', 'checkout', self._configuration_version], stderr=subprocess.STDOUT)
 
     def _obtain_deployment(self):
-        self.deployment = _find_deployment(self._load_deployments(self._source_directory_base), self.location, self._args.application, self._args.stripe, self._args.instance)
-        if self.deployment is None:
-            raise KeyError("Failed to find deployment for environment=%s, data center=%s, application=%s, stripe=%s, instance=%s" %
-                    (self.location.environment, self.location.data_center, self._args.application, self._args.stripe, self._args.instance))
-        self.deployment.load_configurations()
+        key = DeploymentKey(self.location.environment, self.location.data_center, self._args.application, self._args.stripe, self._args.instance)
+        entry = self._index_deployments(self._source_directory_base).get(key)
+        if entry is None:
+            raise KeyError("Failed to find deployment for environment=%s, data center=%s, application=%s, stripe=%s, instance=%s" % key)
+        self.deployment = self._load_deployment(entry)
 
     def _build_deployment(self):
         if os.path.isdir('deployments'):
             shutil.rmtree('deployments')
-        self.deployment.create()
+        self.deployment.create(self._args.io_threads)
 
     def _validate_configuration(self):
         if not self._use_local_configuration and self._should_validate:
@@ -237,7 +231,7 @@ class DeploymentRunner(object):
 
     def _execute(self):
         command_builder = self._command_builders[self._args.mode]()
-        command_builder.build(self.deployment, write_to_file=False)
+        command_builder.build(self.deployment)
         return command_builder.execute(self)
 
 runner = DeploymentRunner()
@@ -0,0 +1,74 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bootstrap
+from bootstrapper.deployment import Deployment
+
+
+def write_files(root, files):
+    for (path, contents) in files.items():
+        filename = os.path.join(str(root), path)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        if isinstance(contents, (dict, list)):
+            contents = json.dumps(contents)
+        with open(filename, 'wb' if isinstance(contents, bytes) else 'w') as f:
+            f.write(contents)
+
+
+def read_file(root, *path):
+    with open(os.path.join(str(root), *path), 'r') as f:
+        return f.read()
+
+
+def run_bootstrap(*args):
+    bootstrap.main([str(arg) for arg in args])
+
+
+def build_command(tmp_path, builder, configuration):
+    # Builds a command for a single platform deployment whose common_params.json holds the given configuration
+    vm_arguments = dict({'textAdmin': 1500}, **configuration.get('vmArgs', {}))
+    write_files(tmp_path, {
+            'repo/common/dev/AM1/common_params.json': dict(configuration, appType='platform', vmArgs=vm_arguments),
+            'repo/common/dev/AM1/app.properties': "MC_APPLICATION_ID=5\nMC_NETWORK_DEVICE=eth0\n"})
+    deployment = Deployment(environment='dev', data_center='AM1', application='app', stripe='s1', instance='i1',
+            root=str(tmp_path / 'repo'), builders=[builder])
+    builder.build(deployment)
+    return builder
+
+
+def snapshot(directory):
+    contents = {}
+    for (parent, dirnames, filenames) in os.walk(directory):
+        dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+        for name in dirnames:
+            contents[os.path.relpath(os.path.join(parent, name), directory)] = None
+        for name in filenames:
+            with open(os.path.join(parent, name), 'rb') as f:
+                contents[os.path.relpath(os.path.join(parent, name), directory)] = f.read()
+    return contents
+
+
+def deployments_directory(root):
+    return os.path.join(str(root), 'deployments')
+
+
+@pytest.fixture
+def config_repo(tmp_path):
+    # Two stripes of one application in the directory layout (common/<env>/<dc>, overrides/<app>/<stripe>/<instance>)
+    write_files(tmp_path, {
+        'common/dev/AM1/common_params.json': {'appType': 'platform', 'memory': {'min': '1g', 'max': '2g'}},
+        'common/dev/AM1/app.properties': "HOST=host-${STRIPE}\nPORT=9000\n",
+        'common/dev/AM1/shared.txt': "host=${HOST}\n",
+        'common/dev/AM1/static.bin': b'\x00\x01plain',
+        'overrides/app/s1/i1/app_params.json': {'vmArgs': {'baseArgs': ['-server']}},
+        'overrides/app/s1/i1/config/instance.cfg': "${INSTANCE}:${PORT}\n",
+        'overrides/app/s1/i1/logs/.gitkeep': "",
+        'overrides/app/s2/i1/app_params.json': {},
+        'overrides/app/s2/i1/config/instance.cfg': "${STRIPE}/${INSTANCE}\n",
+        })
+    return tmp_path
@@ -0,0 +1,76 @@
+import pytest
+
+from bootstrapper.affinity import Affinity, affinity_prefix, format_cpu_list, parse_affinity, parse_cpu_list, validate_affinity
+from bootstrapper.commands import DockerCommandBuilder, PlatformCommandBuilder
+
+from conftest import build_command, write_files
+
+
+@pytest.fixture
+def sysfs(tmp_path):
+    # Two NUMA nodes with four CPUs each; CPUs 2-3 are isolated and CPU 7 is offline
+    write_files(tmp_path, {
+            'sys/devices/system/cpu/online': "0-6\n",
+            'sys/devices/system/cpu/isolated': "2-3\n",
+            'sys/devices/system/node/node0/cpulist': "0-3\n",
+            'sys/devices/system/node/node1/cpulist': "4-7\n"})
+    return str(tmp_path / 'sys')
+
+
+def test_cpu_lists_round_trip():
+    assert parse_cpu_list("0-2, 5,7-8") == (0, 1, 2, 5, 7, 8)
+    assert parse_cpu_list([3, 1]) == (1, 3)
+    assert parse_cpu_list(4) == (4,)
+    assert format_cpu_list([8, 0, 1, 2, 5, 7]) == "0-2,5,7-8"
+
+
+@pytest.mark.parametrize('cpus', ["", "1-", "3-1", "a"])
+def test_invalid_cpu_lists(cpus):
+    with pytest.raises(ValueError):
+        parse_cpu_list(cpus)
+
+
+def test_parse_affinity():
+    assert parse_affinity(None) is None
+    assert parse_affinity({'cpus': '2-3', 'isolated': True}) == Affinity((2, 3), None, True)
+    assert parse_affinity({'numaNode': 1}) == Affinity(None, 1, False)
+
+
+@pytest.mark.parametrize('configuration', [{'isolated': True}, {'cpus': '1', 'node': 0}, {'numaNode': 'x'}, {'numaNode': 0, 'isolated': True}, {'cpus': '1', 'isolated': 'yes'}])
+def test_invalid_affinity(configuration):
+    with pytest.raises((ValueError, TypeError)):
+        parse_affinity(configuration)
+
+
+def test_validate_affinity_accepts_matching_hosts(sysfs):
+    validate_affinity(Affinity((2, 3), 0, True), sysfs)
+    validate_affinity(Affinity(None, 1, False), sysfs)
+
+
+@pytest.mark.parametrize(('affinity', 'message'), [
+        (Affinity((6, 7), None, False), "not online"),
+        (Affinity((1, 2), None, True), "not isolated"),
+        (Affinity(None, 2, False), "does not exist"),
+        (Affinity((3, 4), 1, False), "do not belong")])
+def test_validate_affinity_rejects_mismatched_hosts(sysfs, affinity, message):
+    with pytest.raises(ValueError, match=message):
+        validate_affinity(affinity, sysfs)
+
+
+def test_affinity_prefix():
+    assert affinity_prefix(None) == []
+    assert affinity_prefix(Affinity((2, 3), None, False)) == ['taskset', '--cpu-list', '2-3']
+    assert affinity_prefix(Affinity(None, 1, False)) == ['numactl', '--membind=1', '--cpunodebind=1']
+    assert affinity_prefix(Affinity((4, 5), 1, False)) == ['numactl', '--membind=1', '--physcpubind=4-5']
+
+
+def test_platform_command_is_pinned(tmp_path):
+    builder = build_command(tmp_path, PlatformCommandBuilder(), {'vmArgs': {'affinity': {'cpus': '2-3', 'numaNode': 0}}})
+    assert builder.command[:4] == ['numactl', '--membind=0', '--physcpubind=2-3', 'java']
+
+
+def test_docker_command_is_pinned(tmp_path):
+    builder = build_command(tmp_path, DockerCommandBuilder(), {'vmArgs': {'affinity': {'cpus': [2, 3], 'numaNode': 0}}})
+    command = builder.command
+    assert command[command.index('--cpuset-cpus') + 1] == '2-3'
+    assert command[command.index('--cpuset-mems') + 1] == '0'
@@ -0,0 +1,58 @@
+import pytest
+
+from bootstrapper.cache import FileCache
+from bootstrapper.configuration import json_file_cache, load_json_file
+from bootstrapper.manifest import _file_digest_cache, file_digest
+from bootstrapper.properties import _properties_file_cache, load_properties_file, load_properties_layer
+
+
+def _loader(calls):
+    def load(filename):
+        calls.append(filename)
+        with open(filename, 'r') as f:
+            return f.read()
+    return load
+
+
+def test_file_cache_reloads_only_when_the_file_changes(tmp_path):
+    filename = tmp_path / 'a.txt'
+    filename.write_text("one")
+    calls = []
+    cache = FileCache(_loader(calls))
+    assert cache.get(str(filename)) == "one"
+    assert cache.get(str(filename)) == "one"
+    assert (cache.hits, cache.misses, len(calls)) == (1, 1, 1)
+
+    filename.write_text("changed")
+    assert cache.get(str(filename)) == "changed"
+    assert len(calls) == 2
+
+
+def test_parsed_properties_files_are_shared(tmp_path):
+    filename = tmp_path / 'app.properties'
+    filename.write_text("A=1\nB=${A}\n")
+    parsed = load_properties_file(str(filename))
+    assert dict(parsed) == {'A': '1', 'B': '${A}'}
+    assert load_properties_file(str(filename)) is parsed
+
+
+def test_properties_layer_prefers_later_files(tmp_path):
+    first = tmp_path / 'first.properties'
+    second = tmp_path / 'second.properties'
+    first.write_text("A=first\n")
+    second.write_text("A=second\nB=second\n")
+    layer = load_properties_layer([str(first), str(second)])
+    assert dict(layer) == {'A': 'second', 'B': 'second'}
+    assert load_properties_layer([str(first), str(second)]) is layer
+
+
+@pytest.mark.parametrize(('cache', 'load'), [(json_file_cache, load_json_file), (_file_digest_cache, file_digest), (_properties_file_cache, load_properties_file)])
+def test_module_caches_stay_bounded(tmp_path, monkeypatch, cache, load):
+    monkeypatch.setattr(cache, '_max_size', 3)
+    cache.clear()
+    for index in range(10):
+        filename = tmp_path / ('%d.json' % index)
+        filename.write_text('{"A": %d}' % index)
+        load(str(filename))
+    assert len(cache) == 3
+    cache.clear()
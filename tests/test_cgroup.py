@@ -0,0 +1,53 @@
+from bootstrapper.cgroup import ResourceLimits, effective_resources, host_resources, read_cgroup_limits
+from bootstrapper.utils import format_size, parse_size
+
+from conftest import write_files
+
+
+def test_cgroup_v2_limits_take_the_tightest_ancestor(tmp_path):
+    write_files(tmp_path, {
+            'proc': "0::/app.slice/service\n",
+            'cgroup/cgroup.controllers': "cpu memory\n",
+            'cgroup/memory.max': "max\n",
+            'cgroup/cpu.max': "max 100000\n",
+            'cgroup/app.slice/memory.max': "%d\n" % (2 * 1024 ** 3),
+            'cgroup/app.slice/cpu.max': "400000 100000\n",
+            'cgroup/app.slice/service/memory.max': "%d\n" % (4 * 1024 ** 3),
+            'cgroup/app.slice/service/cpu.max': "150000 100000\n"})
+    limits = read_cgroup_limits(str(tmp_path / 'cgroup'), str(tmp_path / 'proc'))
+    assert limits == ResourceLimits(2 * 1024 ** 3, 1.5)
+
+
+def test_cgroup_v2_without_limits(tmp_path):
+    write_files(tmp_path, {'proc': "0::/\n", 'cgroup/cgroup.controllers': "", 'cgroup/memory.max': "max\n"})
+    assert read_cgroup_limits(str(tmp_path / 'cgroup'), str(tmp_path / 'proc')) == ResourceLimits(None, None)
+
+
+def test_cgroup_v1_limits(tmp_path):
+    write_files(tmp_path, {
+            'proc': "11:memory:/docker/abc\n4:cpu,cpuacct:/docker/abc\n",
+            'cgroup/memory/memory.limit_in_bytes': "%d\n" % 0x7FFFFFFFFFFFF000,
+            'cgroup/memory/docker/abc/memory.limit_in_bytes': "%d\n" % (512 * 1024 ** 2),
+            'cgroup/cpu,cpuacct/cpu.cfs_quota_us': "-1\n",
+            'cgroup/cpu,cpuacct/cpu.cfs_period_us': "100000\n",
+            'cgroup/cpu,cpuacct/docker/abc/cpu.cfs_quota_us': "200000\n",
+            'cgroup/cpu,cpuacct/docker/abc/cpu.cfs_period_us': "100000\n"})
+    assert read_cgroup_limits(str(tmp_path / 'cgroup'), str(tmp_path / 'proc')) == ResourceLimits(512 * 1024 ** 2, 2.0)
+
+
+def test_effective_resources_never_exceed_the_host(tmp_path):
+    host = host_resources()
+    write_files(tmp_path, {
+            'proc': "0::/\n",
+            'cgroup/cgroup.controllers': "",
+            'cgroup/memory.max': "%d\n" % (host.memory * 2),
+            'cgroup/cpu.max': "50000 100000\n"})
+    assert effective_resources(str(tmp_path / 'cgroup'), str(tmp_path / 'proc')) == ResourceLimits(host.memory, 0.5)
+
+
+def test_sizes_round_trip():
+    assert parse_size('2g') == 2 * 1024 ** 3
+    assert parse_size('512MB') == 512 * 1024 ** 2
+    assert parse_size(100) == 100
+    assert format_size(3 * 1024 ** 2) == '3m'
+    assert format_size(1500) == '1500'
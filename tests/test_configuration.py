@@ -0,0 +1,54 @@
+import pytest
+
+from bootstrapper.configuration import Configuration, FrozenDict, FrozenList, load_json_file
+from bootstrapper.properties import Properties
+
+
+def test_merge_with_shares_untouched_subtrees():
+    memory = {'min': '1g', 'max': '2g'}
+    configuration = Configuration({'memory': memory, 'vmArgs': {'baseArgs': ['-server']}})
+    merged = configuration.merge_with({'vmArgs': {'baseArgs': ['-verbose:gc']}, 'appType': 'platform'})
+    assert merged['memory'] is memory
+    assert merged['vmArgs']['baseArgs'] == ['-server', '-verbose:gc']
+    assert configuration['vmArgs']['baseArgs'] == ['-server']
+    assert 'appType' not in configuration
+
+
+def test_apply_properties_copies_only_changed_subtrees():
+    static = {'port': 80}
+    configuration = Configuration({'static': static, 'dynamic': {'host': '${HOST}'}})
+    applied = configuration.apply_properties(Properties(HOST='h1'))
+    assert applied['static'] is static
+    assert applied['dynamic'] == {'host': 'h1'}
+    assert configuration['dynamic'] == {'host': '${HOST}'}
+
+
+def test_loaded_json_is_immutable(tmp_path):
+    filename = tmp_path / 'common_params.json'
+    filename.write_text('{"vmArgs": {"baseArgs": ["-server"]}}')
+    loaded = load_json_file(str(filename))
+    assert isinstance(loaded, FrozenDict)
+    assert isinstance(loaded['vmArgs']['baseArgs'], FrozenList)
+    with pytest.raises(TypeError):
+        loaded['vmArgs']['baseArgs'].append('-client')
+    with pytest.raises(TypeError):
+        loaded['appType'] = 'platform'
+    assert load_json_file(str(filename)) is loaded
+
+
+def test_lazy_configuration_applies_properties_on_access():
+    configuration = Configuration({'${NAME}': {'host': '${HOST}'}, 'broken': '${MISSING}'})
+    lazy = configuration.apply_properties_lazily(Properties(NAME='service', HOST='h1'))
+    assert set(lazy) == {'service', 'broken'}
+    assert lazy['service']['host'] == 'h1'
+    assert lazy['service'] is lazy['service']
+    with pytest.raises(KeyError):
+        lazy['broken']
+
+
+def test_lazy_configuration_materializes_like_apply_properties():
+    configuration = Configuration({'vmArgs': {'baseArgs': ['-Dhost=${HOST}']}, 'appType': 'platform'})
+    properties = Properties(HOST='h1')
+    lazy = configuration.apply_properties_lazily(properties)
+    assert lazy.materialize() == configuration.apply_properties(properties)
+    assert lazy.application_type == 'platform'
@@ -0,0 +1,109 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from commands import _index_deployments, _load_deployment
+from commands.deploy import DeploymentGenerator, _affected_keys, _changed_files
+
+from conftest import deployments_directory, read_file, run_bootstrap, snapshot, write_files
+
+
+def test_parallel_deploy_matches_serial_deploy(config_repo):
+    run_bootstrap('deploy', '-p', config_repo)
+    serial = snapshot(deployments_directory(config_repo))
+    shutil.rmtree(deployments_directory(config_repo))
+    run_bootstrap('deploy', '-p', config_repo, '--jobs', 2)
+    assert snapshot(deployments_directory(config_repo)) == serial
+    assert read_file(deployments_directory(config_repo), 'dev', 'AM1', 'app', 's2', 'i1', 'config', 'instance.cfg') == "s2/i1\n"
+
+
+def test_deploy_reports_failures_after_creating_the_rest(config_repo):
+    write_files(config_repo, {'overrides/app/s2/i1/config/instance.cfg': "${MISSING}\n"})
+    with pytest.raises(RuntimeError, match="Failed to create 1 of 2"):
+        run_bootstrap('deploy', '-p', config_repo, '--jobs', 2)
+    assert os.path.isdir(os.path.join(deployments_directory(config_repo), 'dev', 'AM1', 'app', 's1', 'i1'))
+    assert not os.path.exists(os.path.join(deployments_directory(config_repo), '.manifests', 'dev', 'AM1', 'app', 's2', 'i1.json'))
+
+
+def test_deploy_rejects_non_positive_jobs(config_repo):
+    with pytest.raises(ValueError):
+        run_bootstrap('deploy', '-p', config_repo, '--jobs', 0)
+
+
+def test_deploy_copies_files_without_templates_verbatim(config_repo):
+    run_bootstrap('deploy', '-p', config_repo)
+    with open(os.path.join(deployments_directory(config_repo), 'dev', 'AM1', 'app', 's1', 'i1', 'static.bin'), 'rb') as f:
+        assert f.read() == b'\x00\x01plain'
+    assert read_file(deployments_directory(config_repo), 'dev', 'AM1', 'app', 's1', 'i1', 'shared.txt') == "host=host-s1\n"
+
+
+def test_deployments_are_created_as_they_are_loaded(config_repo):
+    generator = DeploymentGenerator(_index_deployments, _load_deployment)
+    generator._io_threads = 1
+    created = []
+
+    def deployments():
+        for entry in _index_deployments(str(config_repo)).values():
+            # The previous deployment must already be on disk before the next one is loaded
+            assert all(os.path.isdir(output_directory) for output_directory in created)
+            deployment = _load_deployment(entry)
+            created.append(deployment.output_directory)
+            yield deployment
+
+    (keys, pending, errors, _) = generator._create_deployments(deployments(), deployments_directory(config_repo), 1, False, None)
+    assert (len(keys), pending, errors) == (2, 2, [])
+
+
+def test_selected_deploy_leaves_other_deployments_alone(config_repo):
+    run_bootstrap('deploy', '-p', config_repo)
+    write_files(config_repo, {'overrides/app/s1/i1/config/instance.cfg': "${STRIPE}\n", 'overrides/app/s2/i1/config/instance.cfg': "${STRIPE}\n"})
+    run_bootstrap('deploy', '-p', config_repo, '--stripe', 's1')
+    app = os.path.join(deployments_directory(config_repo), 'dev', 'AM1', 'app')
+    assert read_file(app, 's1', 'i1', 'config', 'instance.cfg') == "s1\n"
+    assert read_file(app, 's2', 'i1', 'config', 'instance.cfg') == "s2/i1\n"
+
+
+def test_selected_deploy_removes_only_matching_stale_deployments(config_repo):
+    run_bootstrap('deploy', '-p', config_repo)
+    shutil.rmtree(os.path.join(str(config_repo), 'overrides', 'app', 's2'))
+    run_bootstrap('deploy', '-p', config_repo, '--stripe', 's1')
+    assert os.path.isdir(os.path.join(deployments_directory(config_repo), 'dev', 'AM1', 'app', 's2', 'i1'))
+    run_bootstrap('deploy', '-p', config_repo, '--stripe', 's*')
+    assert not os.path.exists(os.path.join(deployments_directory(config_repo), 'dev', 'AM1', 'app', 's2'))
+
+
+def _commit_all(root):
+    for arguments in (['init', '-q'], ['add', '-A'], ['-c', 'user.name=test', '-c', 'user.email=test@example.com', 'commit', '-q', '-m', 'configuration']):
+        subprocess.run(['git', '-C', str(root)] + arguments, check=True)
+
+
+def test_changed_since_creates_only_affected_deployments(config_repo):
+    _commit_all(config_repo)
+    write_files(config_repo, {'overrides/app/s1/i1/config/instance.cfg': "${STRIPE}\n"})
+    run_bootstrap('deploy', '-p', config_repo, '--changed-since', 'HEAD')
+    app = os.path.join(deployments_directory(config_repo), 'dev', 'AM1', 'app')
+    assert read_file(app, 's1', 'i1', 'config', 'instance.cfg') == "s1\n"
+    assert not os.path.exists(os.path.join(app, 's2'))
+
+
+def test_changed_since_treats_common_files_as_shared(config_repo):
+    _commit_all(config_repo)
+    write_files(config_repo, {'common/dev/AM1/app.properties': "HOST=changed-${STRIPE}\nPORT=9000\n"})
+    assert _affected_keys(_index_deployments(str(config_repo)), str(config_repo), _changed_files(str(config_repo), 'HEAD')) == \
+            set(_index_deployments(str(config_repo)))
+
+
+def test_changed_since_ignores_generated_output(config_repo):
+    _commit_all(config_repo)
+    run_bootstrap('deploy', '-p', config_repo)
+    assert _changed_files(str(config_repo), 'HEAD') == set()
+    write_files(config_repo, {'overrides/app/s2/i1/new.txt': "new"})
+    assert _changed_files(str(config_repo), 'HEAD') == {os.path.join(str(config_repo), 'overrides', 'app', 's2', 'i1', 'new.txt')}
+
+
+def test_invalid_shard_is_reported_with_its_reason(config_repo, capsys):
+    with pytest.raises(SystemExit):
+        run_bootstrap('deploy', '-p', config_repo, '--shard', '0/2')
+    assert "Shard 0/2 is out of range" in capsys.readouterr().err
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from bootstrapper.commands.builder import Builder
+from bootstrapper.deployment import Deployment
+from bootstrapper.tree import RenderedFile, RenderedTree
+
+from conftest import write_files
+
+
+class _FileWritingBuilder(Builder):
+    def build(self, deployment):
+        pass
+
+    def write_to_file(self, deployment):
+        write_files(deployment.output_directory, {'scripts/legacy.sh': "#!/bin/sh\n", 'empty/.keep': ""})
+        os.chmod(os.path.join(deployment.output_directory, 'scripts', 'legacy.sh'), 0o755)
+        os.remove(os.path.join(deployment.output_directory, 'empty', '.keep'))
+
+
+class _IncompleteBuilder(Builder):
+    def build(self, deployment):
+        pass
+
+
+def _deployment(root, stripe='s1', builders=()):
+    return Deployment(environment='dev', data_center='AM1', application='app', stripe=stripe, instance='i1',
+            properties=['app.properties'], root=str(root), builders=list(builders))
+
+
+def _contents(tree):
+    return {path: rendered_file.contents for (path, rendered_file) in tree.items()}
+
+
+def _files_and_directories(directory):
+    found = set()
+    for (parent, dirnames, filenames) in os.walk(directory):
+        found.update(os.path.relpath(os.path.join(parent, name), directory) for name in dirnames + filenames)
+    return found
+
+
+def test_render_returns_the_files_create_writes(config_repo):
+    tree = _deployment(config_repo).render()
+    assert _contents(tree) == {
+            'config/instance.cfg': b"i1:9000\n",
+            'shared.txt': b"host=host-s1\n",
+            'static.bin': b'\x00\x01plain'}
+
+    deployment = _deployment(config_repo)
+    deployment.create()
+    assert _files_and_directories(deployment.output_directory) == set(tree) | tree.directories
+
+
+def test_render_keeps_directories_whose_files_are_all_ignored(config_repo):
+    tree = _deployment(config_repo).render()
+    assert 'logs' in tree.directories
+    deployment = _deployment(config_repo)
+    deployment.create()
+    assert os.listdir(os.path.join(deployment.output_directory, 'logs')) == []
+
+
+def test_write_to_creates_empty_directories(tmp_path):
+    tree = RenderedTree({'a/b.txt': RenderedFile("b")})
+    tree.add_directory('empty/nested')
+    merged = RenderedTree()
+    merged.update(tree)
+    merged.write_to(str(tmp_path))
+    assert (tmp_path / 'a' / 'b.txt').read_text() == "b"
+    assert os.listdir(str(tmp_path / 'empty' / 'nested')) == []
+
+
+def test_render_captures_builders_that_only_write_files(config_repo):
+    deployment = _deployment(config_repo, builders=[_FileWritingBuilder()])
+    tree = deployment.render()
+    assert tree['scripts/legacy.sh'].contents == b"#!/bin/sh\n"
+    assert tree['scripts/legacy.sh'].mode & 0o777 == 0o755
+    assert 'empty' in tree.directories
+    assert not os.path.exists(deployment.output_directory)
+
+
+def test_render_rejects_builders_without_output(config_repo):
+    with pytest.raises(NotImplementedError, match="_IncompleteBuilder"):
+        _deployment(config_repo, builders=[_IncompleteBuilder()]).render()
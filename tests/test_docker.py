@@ -0,0 +1,82 @@
+import pytest
+
+from bootstrapper.commands import DockerCommandBuilder
+
+from conftest import build_command
+
+
+def _build(tmp_path, container=None, **configuration):
+    if container is not None:
+        configuration['dockerContainer'] = container
+    return build_command(tmp_path, DockerCommandBuilder(), configuration).command
+
+
+def _options(command, name):
+    return [command[index + 1] for (index, argument) in enumerate(command) if argument == name]
+
+
+def test_resource_limits(tmp_path):
+    command = _build(tmp_path, {'cpus': 2.5, 'shmSize': '256m', 'ipc': 'shareable',
+            'ulimits': {'memlock': 'unlimited', 'nofile': {'soft': 1024, 'hard': 4096}}}, memory={'min': '1g', 'max': '2g'})
+    assert _options(command, '--memory') == ['2g']
+    assert _options(command, '--memory-reservation') == ['1g']
+    assert _options(command, '--cpus') == ['2.5']
+    assert _options(command, '--ipc') == ['shareable']
+    assert _options(command, '--shm-size') == ['256m']
+    assert _options(command, '--ulimit') == ['memlock=-1:-1', 'nofile=1024:4096']
+
+
+def test_published_ports_and_networks(tmp_path):
+    ports = [8080, {'host': 9000, 'container': 9001}]
+    assert _options(_build(tmp_path, {'ports': ports}), '--publish') == ['8080', '9000:9001']
+    command = _build(tmp_path, {'ports': ports, 'network': 'backend'})
+    assert (_options(command, '--network'), _options(command, '--publish')) == (['backend'], ['8080', '9000:9001'])
+
+
+def test_host_network_does_not_publish_ports(tmp_path):
+    command = _build(tmp_path, {'ports': [8080], 'network': 'host'})
+    assert (_options(command, '--network'), _options(command, '--publish')) == (['host'], [])
+
+
+@pytest.mark.parametrize('network', ['none', 'container:sidecar'])
+def test_isolated_networks(tmp_path, network):
+    assert _options(_build(tmp_path, {'network': network}), '--network') == [network]
+    with pytest.raises(ValueError, match="cannot be published"):
+        _build(tmp_path, {'network': network, 'ports': [8080]})
+
+
+@pytest.mark.parametrize(('container', 'memory'), [
+        ({'cpus': 0}, None),
+        ({'ipc': 'public'}, None),
+        ({'ipc': 'host', 'shmSize': '64m'}, None),
+        ({'ulimits': {'nproc': 10}}, None),
+        ({'ulimits': {'nofile': {'soft': 4096, 'hard': 1024}}}, None),
+        ({}, {'max': '1m'}),
+        ({}, {'min': '2g', 'max': '1g'})])
+def test_invalid_options(tmp_path, container, memory):
+    with pytest.raises(ValueError):
+        _build(tmp_path, container, **({'memory': memory} if memory else {}))
+
+
+class _Runner(object):
+    def __init__(self, run_directory, deployment):
+        self.run_directory = run_directory
+        self.deployment = deployment
+        self.deployment_info = {'image_name': 'registry/app', 'image_version': '1.2'}
+
+
+def test_execute_runs_the_deployment_image(tmp_path, monkeypatch):
+    builder = DockerCommandBuilder()
+    configuration = {'dockerContainer': {'network': 'host'}}
+    build_command(tmp_path, builder, configuration)
+    commands = []
+    monkeypatch.setattr(builder, '_pull_docker_image', commands.append)
+    monkeypatch.setattr(builder, '_do_execute', commands.append)
+
+    class _Deployment(object):
+        class configuration(object):
+            start_script_filename = 'start_app.sh'
+
+    builder.execute(_Runner(str(tmp_path), _Deployment()))
+    assert commands[0] == 'registry/app:1.2'
+    assert commands[1][-2:] == ['registry/app:1.2', 'scripts/start_app.sh']
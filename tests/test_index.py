@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+from bootstrapper.deployment import Deployment, DeploymentKey, DeploymentSpec
+from commands import _index_deployments, _load_deployment
+
+from conftest import write_files
+
+
+def test_directory_layout_is_indexed_by_key(config_repo):
+    index = _index_deployments(str(config_repo))
+    assert set(index) == {DeploymentKey('dev', 'AM1', 'app', 's1', 'i1'), DeploymentKey('dev', 'AM1', 'app', 's2', 'i1')}
+    assert all(isinstance(entry, DeploymentSpec) for entry in index.values())
+
+
+def test_load_deployment_constructs_only_the_requested_entry(config_repo):
+    index = _index_deployments(str(config_repo))
+    deployment = _load_deployment(index[DeploymentKey('dev', 'AM1', 'app', 's1', 'i1')])
+    assert isinstance(deployment, Deployment)
+    assert deployment.properties['HOST'] == 'host-s1'
+
+
+def test_deploy_json_entries_become_specs(tmp_path):
+    write_files(tmp_path, {'deploy.json': [
+            {'environment': 'dev', 'data_center': 'AM1', 'application': 'app', 'stripe': 's1', 'instance': 'i1', 'properties': 'missing.properties'}]})
+    index = _index_deployments(str(tmp_path))
+    spec = index[DeploymentKey('dev', 'AM1', 'app', 's1', 'i1')]
+    assert spec.root == str(tmp_path)
+    assert spec.properties_files == (os.path.join(str(tmp_path), 'common', 'dev', 'AM1', 'missing.properties'),)
+    with pytest.raises(FileNotFoundError):
+        spec.load()
+
+
+def test_deploy_py_dict_entries_are_indexed(tmp_path):
+    write_files(tmp_path, {'deploy.py': "deployments = [dict(environment='dev', data_center='AM1', application='app', stripe='s1', instance='i1')]\n"})
+    spec = _index_deployments(str(tmp_path))[DeploymentKey('dev', 'AM1', 'app', 's1', 'i1')]
+    assert isinstance(spec, DeploymentSpec)
+    assert spec.overrides_directory == os.path.join(str(tmp_path), 'overrides', 'app', 's1', 'i1')
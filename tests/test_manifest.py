@@ -0,0 +1,83 @@
+import importlib.util
+import os
+import sys
+
+from bootstrapper.commands.builder import Builder
+from bootstrapper.deployment import DeploymentSpec
+from bootstrapper.manifest import DeploymentManifest, build_manifest, builder_fingerprint, load_manifest
+
+from conftest import read_file, run_bootstrap, write_files
+
+
+class _ConfiguredBuilder(Builder):
+    def __init__(self, option):
+        self._option = option
+
+    def build(self, deployment):
+        pass
+
+
+def _load_builder_module(filename):
+    # Registered like commands._load_deployment_module registers deploy.py
+    spec = importlib.util.spec_from_file_location('generated_builder', filename)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _deployment(root, stripe='s1'):
+    return DeploymentSpec(environment='dev', data_center='AM1', application='app', stripe=stripe, instance='i1',
+            properties=['app.properties'], root=str(root)).load()
+
+
+def test_manifest_round_trips(config_repo, tmp_path):
+    manifest = build_manifest(_deployment(config_repo))
+    filename = str(tmp_path / 'manifest.json')
+    manifest.save(filename)
+    assert load_manifest(filename) == manifest
+    assert 'overrides/app/s1/i1/config/instance.cfg' in manifest.inputs
+    assert 'common/dev/AM1/app.properties' in manifest.inputs
+
+
+def test_manifest_changes_with_inputs(config_repo):
+    before = build_manifest(_deployment(config_repo))
+    write_files(config_repo, {'overrides/app/s1/i1/config/instance.cfg': "changed ${PORT}\n"})
+    assert build_manifest(_deployment(config_repo)) != before
+
+
+def test_manifest_from_another_bootstrapper_is_outdated(config_repo):
+    manifest = build_manifest(_deployment(config_repo))
+    other = DeploymentManifest(manifest.key, manifest.inputs, manifest.builders, '0.0.1+0000000000000000')
+    assert other != manifest
+
+
+def test_builder_fingerprint_covers_attributes_and_class():
+    assert builder_fingerprint(_ConfiguredBuilder(1)) == builder_fingerprint(_ConfiguredBuilder(1))
+    assert builder_fingerprint(_ConfiguredBuilder(1)) != builder_fingerprint(_ConfiguredBuilder(2))
+    assert '_ConfiguredBuilder' in builder_fingerprint(_ConfiguredBuilder(1))
+
+
+def test_builder_fingerprint_covers_builder_source(tmp_path):
+    filename = str(tmp_path / 'generated_builder.py')
+    source = "from bootstrapper.commands.builder import Builder\n\nclass Generated(Builder):\n    def build(self, deployment):\n        pass\n"
+    write_files(tmp_path, {'generated_builder.py': source})
+    before = builder_fingerprint(_load_builder_module(filename).Generated())
+    write_files(tmp_path, {'generated_builder.py': source + "\n    # behaviour changed\n"})
+    assert builder_fingerprint(_load_builder_module(filename).Generated()) != before
+    del sys.modules['generated_builder']
+
+
+def test_deploy_skips_deployments_whose_inputs_did_not_change(config_repo):
+    run_bootstrap('deploy', '-p', config_repo)
+    output = os.path.join(str(config_repo), 'deployments', 'dev', 'AM1', 'app')
+    write_files(output, {'s1/i1/marker': "", 's2/i1/marker': ""})
+
+    write_files(config_repo, {'overrides/app/s1/i1/config/instance.cfg': "${STRIPE}\n"})
+    run_bootstrap('deploy', '-p', config_repo)
+    assert read_file(output, 's1', 'i1', 'config', 'instance.cfg') == "s1\n"
+    assert not os.path.exists(os.path.join(output, 's1', 'i1', 'marker'))
+    assert os.path.exists(os.path.join(output, 's2', 'i1', 'marker'))
+
+    run_bootstrap('deploy', '-p', config_repo, '--force')
+    assert not os.path.exists(os.path.join(output, 's2', 'i1', 'marker'))
@@ -0,0 +1,59 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import deployments_directory, run_bootstrap, snapshot, write_files
+
+
+@pytest.fixture
+def sharded_repo(config_repo):
+    for stripe in range(3, 9):
+        write_files(config_repo, {'overrides/app/s%d/i1/config/instance.cfg' % stripe: "${STRIPE}/${INSTANCE}\n"})
+    return config_repo
+
+
+def _deploy_shards(root, tmp_path, count):
+    sources = []
+    for index in range(1, count + 1):
+        checkout = tmp_path / ('shard%d' % index)
+        shutil.copytree(str(root), str(checkout))
+        run_bootstrap('deploy', '-p', checkout, '--shard', '%d/%d' % (index, count))
+        sources.append(deployments_directory(checkout))
+    return sources
+
+
+def test_merged_shards_match_a_full_deploy(sharded_repo, tmp_path):
+    run_bootstrap('deploy', '-p', sharded_repo)
+    expected = snapshot(deployments_directory(sharded_repo))
+    shutil.rmtree(deployments_directory(sharded_repo))
+
+    sources = _deploy_shards(sharded_repo, tmp_path, 3)
+    run_bootstrap('merge', '-p', sharded_repo, *sources)
+    assert snapshot(deployments_directory(sharded_repo)) == expected
+    run_bootstrap('deploy', '-p', sharded_repo)
+    assert snapshot(deployments_directory(sharded_repo)) == expected
+
+
+def test_merge_reports_missing_shards(sharded_repo, tmp_path):
+    sources = _deploy_shards(sharded_repo, tmp_path, 3)
+    with pytest.raises(ValueError, match="Missing shard"):
+        run_bootstrap('merge', '-p', sharded_repo, *sources[:2])
+
+
+def test_redeploying_with_another_shard_count_drops_the_old_manifest(sharded_repo, tmp_path):
+    run_bootstrap('deploy', '-p', sharded_repo, '--shard', '1/2')
+    run_bootstrap('deploy', '-p', sharded_repo, '--shard', '1/3')
+    assert os.listdir(os.path.join(deployments_directory(sharded_repo), '.shards')) == ['1-of-3.json']
+
+    sources = [deployments_directory(sharded_repo)] + _deploy_shards(sharded_repo, tmp_path, 3)[1:]
+    target = tmp_path / 'target'
+    shutil.copytree(str(sharded_repo), str(target), ignore=shutil.ignore_patterns('deployments'))
+    run_bootstrap('merge', '-p', target, *sources)
+    assert len(os.listdir(os.path.join(deployments_directory(target), 'dev', 'AM1', 'app'))) == 8
+
+
+def test_merge_rejects_the_target_as_a_shard(sharded_repo):
+    run_bootstrap('deploy', '-p', sharded_repo, '--shard', '1/1')
+    with pytest.raises(ValueError, match="merge target"):
+        run_bootstrap('merge', '-p', sharded_repo, os.path.join(str(sharded_repo), 'deployments', '.'))
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from bootstrapper.objects import HARDLINK, REFLINK, ObjectStore
+
+from conftest import run_bootstrap, write_files
+
+
+def test_store_links_identical_files(tmp_path):
+    write_files(tmp_path, {'tree/a.txt': "same", 'tree/b/c.txt': "same", 'tree/d.txt': "other"})
+    store = ObjectStore(str(tmp_path / 'objects'))
+    assert store.store_tree(str(tmp_path / 'tree')) == len("same")
+    (a, c, d) = (os.stat(str(tmp_path / 'tree' / path)) for path in ('a.txt', 'b/c.txt', 'd.txt'))
+    assert a.st_ino == c.st_ino
+    assert d.st_ino != a.st_ino
+    assert (tmp_path / 'tree' / 'b' / 'c.txt').read_text() == "same"
+
+
+def test_store_keeps_files_with_different_modes_apart(tmp_path):
+    write_files(tmp_path, {'tree/run.sh': "echo", 'tree/notes.txt': "echo"})
+    os.chmod(str(tmp_path / 'tree' / 'run.sh'), 0o755)
+    ObjectStore(str(tmp_path / 'objects')).store_tree(str(tmp_path / 'tree'))
+    assert os.stat(str(tmp_path / 'tree' / 'run.sh')).st_ino != os.stat(str(tmp_path / 'tree' / 'notes.txt')).st_ino
+    assert os.stat(str(tmp_path / 'tree' / 'run.sh')).st_mode & 0o777 == 0o755
+
+
+def test_collect_garbage_removes_unreferenced_objects(tmp_path):
+    write_files(tmp_path, {'tree/a.txt': "kept", 'tree/b.txt': "removed"})
+    store = ObjectStore(str(tmp_path / 'objects'))
+    store.store_tree(str(tmp_path / 'tree'))
+    os.remove(str(tmp_path / 'tree' / 'b.txt'))
+    assert store.collect_garbage() == 1
+    assert store.collect_garbage() == 0
+    assert (tmp_path / 'tree' / 'a.txt').read_text() == "kept"
+
+
+def test_store_rejects_unknown_link_methods(tmp_path):
+    with pytest.raises(ValueError):
+        ObjectStore(str(tmp_path), 'symlink')
+
+
+def test_reflink_store_keeps_contents(tmp_path):
+    write_files(tmp_path, {'tree/a.txt': "same", 'tree/b.txt': "same"})
+    store = ObjectStore(str(tmp_path / 'objects'), REFLINK)
+    store.store_tree(str(tmp_path / 'tree'))
+    store.collect_garbage()
+    assert (tmp_path / 'tree' / 'a.txt').read_text() == (tmp_path / 'tree' / 'b.txt').read_text() == "same"
+
+
+def test_deploy_dedupes_files_shared_between_deployments(config_repo):
+    run_bootstrap('deploy', '-p', config_repo, '--dedupe', HARDLINK)
+    app = os.path.join(str(config_repo), 'deployments', 'dev', 'AM1', 'app')
+    assert os.stat(os.path.join(app, 's1', 'i1', 'static.bin')).st_ino == os.stat(os.path.join(app, 's2', 'i1', 'static.bin')).st_ino
+    assert os.stat(os.path.join(app, 's1', 'i1', 'shared.txt')).st_ino != os.stat(os.path.join(app, 's2', 'i1', 'shared.txt')).st_ino
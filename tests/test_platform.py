@@ -0,0 +1,60 @@
+import pytest
+
+from bootstrapper import cgroup
+from bootstrapper.commands import PlatformCommandBuilder
+
+from conftest import build_command, write_files
+
+
+def _build(tmp_path, configuration, **kwargs):
+    return build_command(tmp_path, PlatformCommandBuilder(**kwargs), configuration)
+
+
+def _fake_cgroup(tmp_path, memory, cpu_max):
+    write_files(tmp_path, {'cgroup/cgroup.controllers': "", 'cgroup/memory.max': "%d\n" % memory, 'cgroup/cpu.max': cpu_max})
+    return str(tmp_path / 'cgroup')
+
+
+def test_fixed_heap_sizes(tmp_path):
+    command = _build(tmp_path, {'memory': {'min': '1g', 'max': '2g'}}).command
+    assert command[:3] == ['java', '-Xms1g', '-Xmx2g']
+
+
+def test_fixed_heap_sizes_must_be_ordered(tmp_path):
+    with pytest.raises(ValueError, match="larger than"):
+        _build(tmp_path, {'memory': {'min': '4g', 'max': '2g'}})
+
+
+def test_auto_memory_leaves_sizing_to_the_jvm_in_the_script(tmp_path):
+    command = _build(tmp_path, {'memory': {'auto': {'heapFraction': 0.5, 'initialHeapFraction': 0.25}}}).command
+    assert command[:3] == ['java', '-XX:InitialRAMPercentage=25', '-XX:MaxRAMPercentage=50']
+    assert not any(argument.startswith(('-Xms', '-Xmx')) for argument in command)
+
+
+@pytest.mark.parametrize('auto', [True, {}])
+def test_auto_memory_defaults(tmp_path, auto):
+    command = _build(tmp_path, {'memory': {'auto': auto}}).command
+    assert command[:3] == ['java', '-XX:InitialRAMPercentage=60', '-XX:MaxRAMPercentage=60']
+
+
+@pytest.mark.parametrize('auto', [False, None])
+def test_auto_memory_can_be_disabled(tmp_path, auto):
+    command = _build(tmp_path, {'memory': {'auto': auto}}).command
+    assert not any(argument.startswith('-XX:MaxRAMPercentage') for argument in command)
+
+
+def test_auto_memory_sizes_from_the_cgroup_at_run_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(cgroup, 'host_resources', lambda: cgroup.ResourceLimits(64 * 1024 ** 3, 64))
+    cgroup_root = _fake_cgroup(tmp_path, 1024 ** 3, "1000000 100000\n")
+    builder = _build(tmp_path, {'memory': {'auto': True}}, cgroup_root=cgroup_root)
+    assert builder._host_memory_arguments() == ['-Xms614m', '-Xmx614m', '-XX:ActiveProcessorCount=10', '-XX:ParallelGCThreads=9', '-XX:ConcGCThreads=2']
+
+
+@pytest.mark.parametrize('memory', [
+        {'auto': True, 'max': '2g'},
+        {'auto': {'heapFraction': 1.5}},
+        {'auto': {'heapFraction': 0.5, 'initialHeapFraction': 0.6}},
+        {'auto': {'fraction': 0.5}}])
+def test_invalid_auto_memory(tmp_path, memory):
+    with pytest.raises(ValueError):
+        _build(tmp_path, {'memory': memory})
@@ -0,0 +1,50 @@
+import pytest
+
+from bootstrapper.commands import PlatformCommandBuilder
+from bootstrapper.commands.profiles import JVM_PROFILES, LOW_LATENCY, SMALL_FOOTPRINT, THROUGHPUT, merge_jvm_arguments
+
+from conftest import build_command
+
+
+def test_profile_arguments_come_first_and_base_arguments_override_them():
+    merged = merge_jvm_arguments(LOW_LATENCY, ['-XX:MaxGCPauseMillis=5', '-XX:+UseStringDeduplication', '-server'])
+    assert merged[0] == '-XX:+UseG1GC'
+    assert '-XX:MaxGCPauseMillis=5' in merged and '-XX:MaxGCPauseMillis=20' not in merged
+    assert '-XX:+UseStringDeduplication' in merged and '-XX:-UseStringDeduplication' not in merged
+    assert merged[-1] == '-server'
+
+
+def test_every_profile_selects_one_collector():
+    for profile in (LOW_LATENCY, THROUGHPUT, SMALL_FOOTPRINT):
+        assert merge_jvm_arguments(profile, []) == list(JVM_PROFILES[profile])
+
+
+def test_every_profile_sets_string_deduplication():
+    for arguments in JVM_PROFILES.values():
+        assert len([argument for argument in arguments if argument.endswith('UseStringDeduplication')]) == 1
+
+
+def test_replacing_the_collector_requires_disabling_the_profiles():
+    with pytest.raises(ValueError, match="more than one garbage collector"):
+        merge_jvm_arguments(THROUGHPUT, ['-XX:+UseG1GC'])
+    merged = merge_jvm_arguments(THROUGHPUT, ['-XX:-UseParallelGC', '-XX:+UseG1GC'])
+    assert '-XX:+UseG1GC' in merged and '-XX:-UseParallelGC' in merged
+
+
+def test_conflicting_base_arguments_are_rejected():
+    with pytest.raises(ValueError, match="Conflicting"):
+        merge_jvm_arguments(SMALL_FOOTPRINT, ['-Xss1m', '-Xss2m'])
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError, match="Unknown JVM profile"):
+        merge_jvm_arguments('fast', [])
+
+
+def test_quoted_base_arguments_stay_whole_with_a_profile(tmp_path):
+    base_arguments = ['-server -Dfoo="a b"', "-Dbar='c d'"]
+    with_profile = build_command(tmp_path / 'profile', PlatformCommandBuilder(), {'vmArgs': {'profile': THROUGHPUT, 'baseArgs': base_arguments}}).command
+    without_profile = build_command(tmp_path / 'plain', PlatformCommandBuilder(), {'vmArgs': {'baseArgs': base_arguments}}).command
+    assert '-Dfoo=a b' in with_profile and '-Dbar=c d' in with_profile
+    assert [argument for argument in without_profile if argument not in JVM_PROFILES[THROUGHPUT]] == \
+            [argument for argument in with_profile if argument not in JVM_PROFILES[THROUGHPUT]]
@@ -0,0 +1,95 @@
+import os
+import stat
+
+import pytest
+
+from bootstrapper.properties import RAISE_ON_EXISTING, LayeredProperties, ParsedProperties, Properties, _PropertiesExpansion
+
+
+def test_apply_to_value_expands_nested_references():
+    properties = Properties(HOST='${NAME}.example.com', NAME='app', URL='http://${HOST}:${PORT}', PORT=80)
+    assert properties.apply_to_value("${URL}/status") == "http://app.example.com:80/status"
+
+
+def test_apply_to_value_leaves_non_templates_untouched():
+    properties = Properties(A='a')
+    assert properties.apply_to_value("plain") == "plain"
+    assert properties.apply_to_value(42) == 42
+
+
+def test_apply_to_value_raises_for_unknown_reference():
+    with pytest.raises(KeyError):
+        Properties(A='a').apply_to_value("${B}")
+
+
+def test_apply_to_file_expands_in_place_and_keeps_the_mode(tmp_path):
+    filename = tmp_path / 'start.sh'
+    filename.write_text("#!/bin/sh\nexec ${APP} --port ${PORT}\n")
+    os.chmod(str(filename), 0o750)
+    Properties(APP='server', PORT='8080').apply_to_file(str(filename))
+    assert filename.read_text() == "#!/bin/sh\nexec server --port 8080\n"
+    assert stat.S_IMODE(os.stat(str(filename)).st_mode) == 0o750
+
+
+def test_apply_to_file_leaves_the_file_untouched_on_failure(tmp_path):
+    filename = tmp_path / 'config.txt'
+    filename.write_text("a=${A}\nb=${MISSING}\n")
+    with pytest.raises(KeyError):
+        Properties(A='1').apply_to_file(str(filename))
+    assert filename.read_text() == "a=${A}\nb=${MISSING}\n"
+    assert os.listdir(str(tmp_path)) == ['config.txt']
+
+
+def test_freeze_resolves_every_property():
+    frozen = Properties(A='${B}/${C}', B='${C}', C='c').freeze()
+    assert dict(frozen) == {'A': 'c/c', 'B': 'c', 'C': 'c'}
+    assert frozen.apply_to_value("${A}") == "c/c"
+
+
+def test_freeze_defers_missing_references_to_lookup():
+    frozen = Properties(A='${MISSING}', B='b').freeze()
+    assert frozen['B'] == 'b'
+    assert 'A' in frozen
+    with pytest.raises(KeyError):
+        frozen['A']
+
+
+def test_freeze_reports_the_reference_cycle():
+    with pytest.raises(ValueError, match="A -> B -> A"):
+        Properties(A='${B}', B='${A}').freeze()
+
+
+def test_properties_expansion_requires_resolve_reference():
+    class Incomplete(_PropertiesExpansion):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_layered_properties_leave_the_base_untouched():
+    base = ParsedProperties({'HOST': 'host-${STRIPE}', 'PORT': '80'})
+    layer = LayeredProperties(base)
+    layer.save('STRIPE', 's1')
+    assert dict(layer.items()) == {'HOST': 'host-${STRIPE}', 'PORT': '80', 'STRIPE': 's1'}
+    assert 'STRIPE' not in base
+    assert layer.freeze()['HOST'] == 'host-s1'
+
+
+def test_layered_properties_share_the_base_resolution():
+    base = ParsedProperties({'A': 'a', 'B': '${A}-b'})
+    first = LayeredProperties(base)
+    first.save('C', '${B}-c')
+    second = LayeredProperties(base)
+    second.save('C', '${A}')
+    assert first.freeze()['C'] == 'a-b-c'
+    assert second.freeze()['C'] == 'a'
+    assert base.resolve() is base.resolve()
+
+
+def test_layered_properties_never_override_the_base():
+    layer = LayeredProperties(ParsedProperties({'A': 'base'}))
+    layer.save('A', 'layer')
+    assert layer['A'] == 'base'
+    with pytest.raises(LookupError):
+        layer.save('A', 'layer', behavior=RAISE_ON_EXISTING)
@@ -0,0 +1,24 @@
+import argparse
+import os
+import stat
+
+from commands.run.runner import DeploymentRunner
+
+from conftest import write_files
+
+
+def test_populate_run_directory_keeps_the_run_directory_metadata(tmp_path, monkeypatch):
+    write_files(tmp_path, {'source/bin/app.sh': "#!/bin/sh\n", 'source/app.jar': "jar"})
+    os.chmod(str(tmp_path / 'source'), 0o700)
+    os.makedirs(str(tmp_path / 'run'))
+    os.chmod(str(tmp_path / 'run'), 0o755)
+    os.utime(str(tmp_path / 'source' / 'app.jar'), (1000000000, 1000000000))
+
+    monkeypatch.setattr(DeploymentRunner, '_source_directory', property(lambda self: str(tmp_path / 'source')))
+    monkeypatch.setattr(DeploymentRunner, 'run_directory', property(lambda self: str(tmp_path / 'run')))
+    runner = DeploymentRunner()
+    runner._args = argparse.Namespace(io_threads=2)
+    runner._populate_run_directory()
+    assert (tmp_path / 'run' / 'bin' / 'app.sh').read_text() == "#!/bin/sh\n"
+    assert stat.S_IMODE(os.stat(str(tmp_path / 'run')).st_mode) == 0o755
+    assert os.stat(str(tmp_path / 'run' / 'app.jar')).st_mtime != 1000000000
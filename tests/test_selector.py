@@ -0,0 +1,50 @@
+import pytest
+
+from bootstrapper.deployment import DeploymentKey
+from bootstrapper.selector import ALL_DEPLOYMENTS, DeploymentSelector, parse_shard, shard_of
+
+
+_KEY = DeploymentKey('dev', 'AM1', 'oms', 's1', 'i1')
+
+
+def test_selector_matches_glob_patterns():
+    assert DeploymentSelector(application='o*', stripe='s[12]').matches(_KEY)
+    assert not DeploymentSelector(environment='prod').matches(_KEY)
+    assert ALL_DEPLOYMENTS.matches(_KEY)
+    assert not ALL_DEPLOYMENTS
+
+
+def test_selector_ignores_unset_patterns():
+    selector = DeploymentSelector(environment=None, stripe='s1')
+    assert selector.patterns == {'stripe': 's1'}
+    assert str(selector) == "*/*/*/s1/*"
+
+
+def test_selector_rejects_unknown_fields():
+    with pytest.raises(ValueError):
+        DeploymentSelector(region='us')
+
+
+def test_shard_of_is_stable_and_in_range():
+    keys = [DeploymentKey('dev', 'AM1', 'oms', 's%d' % stripe, 'i1') for stripe in range(50)]
+    shards = [shard_of(key, 3) for key in keys]
+    assert set(shards) == {1, 2, 3}
+    assert shards == [shard_of(key, 3) for key in keys]
+    assert all(shard_of(key, 1) == 1 for key in keys)
+
+
+def test_selector_with_shard_partitions_keys():
+    keys = [DeploymentKey('dev', 'AM1', 'oms', 's%d' % stripe, 'i1') for stripe in range(20)]
+    selected = [set(key for key in keys if DeploymentSelector(shard=(index, 4)).matches(key)) for index in range(1, 5)]
+    assert set().union(*selected) == set(keys)
+    assert sum(len(keys) for keys in selected) == len(keys)
+
+
+@pytest.mark.parametrize('text', ['1', '0/2', '3/2', 'a/b', '1/0'])
+def test_parse_shard_rejects_invalid_shards(text):
+    with pytest.raises(ValueError):
+        parse_shard(text)
+
+
+def test_parse_shard():
+    assert parse_shard('2/3') == (2, 3)
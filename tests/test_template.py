@@ -0,0 +1,103 @@
+from bootstrapper import template
+from bootstrapper.cache import FileCache
+from bootstrapper.properties import Properties
+from bootstrapper.template import _SCAN_CHUNK_SIZE, RenderedTemplateCache, Template, TemplateFile, compile_template, is_template_file, \
+        load_template_file
+
+
+def test_template_splits_text_and_references():
+    template = Template("a ${X} b ${ Y }${X}")
+    assert template.references == ('X', 'Y')
+    assert template.render(lambda name: name.lower()) == "a x b yx"
+
+
+def test_template_without_references_renders_as_is():
+    template = Template("no references here")
+    assert template.references == ()
+    assert template.render(lambda name: 1 / 0) == "no references here"
+
+
+def test_compile_template_reuses_compiled_templates():
+    assert compile_template("${A}-${B}") is compile_template("${A}-${B}")
+
+
+def test_is_template_file_detects_markers(tmp_path):
+    template = tmp_path / 'template.cfg'
+    template.write_text("host=${HOST}\n")
+    plain = tmp_path / 'plain.cfg'
+    plain.write_text("host=localhost $HOME {braces}\n")
+    assert is_template_file(str(template))
+    assert not is_template_file(str(plain))
+
+
+def test_is_template_file_finds_markers_across_chunks(tmp_path):
+    filename = tmp_path / 'large.cfg'
+    filename.write_bytes(b'x' * (_SCAN_CHUNK_SIZE - 1) + b'${HOST}')
+    assert is_template_file(str(filename))
+
+
+def test_is_template_file_ignores_binary_files(tmp_path):
+    filename = tmp_path / 'binary.dat'
+    filename.write_bytes(b'\x00\x01${HOST}')
+    assert not is_template_file(str(filename))
+
+
+def test_rendered_template_cache_reuses_output_for_the_same_values(tmp_path):
+    filename = tmp_path / 'shared.cfg'
+    filename.write_text("host=${HOST}\n")
+    template_file = load_template_file(str(filename))
+    cache = RenderedTemplateCache()
+    assert cache.render(template_file, Properties(HOST='a', OTHER='1')) == "host=a\n"
+    assert cache.render(template_file, Properties(HOST='a', OTHER='2')) == "host=a\n"
+    assert cache.render(template_file, Properties(HOST='b')) == "host=b\n"
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_rendered_template_cache_evicts_least_recently_used():
+    cache = RenderedTemplateCache(max_size=10)
+    (first, second) = (TemplateFile("${A}------"), TemplateFile("${A}++++++"))
+    cache.render(first, Properties(A='1'))
+    cache.render(second, Properties(A='1'))
+    cache.render(first, Properties(A='1'))
+    assert (cache.hits, cache.misses) == (0, 3)
+
+
+def test_template_file_cache_is_bounded(tmp_path):
+    calls = []
+
+    def load(filename):
+        calls.append(filename)
+        return TemplateFile(open(filename).read())
+
+    cache = FileCache(load, 10, lambda template_file: template_file.size)
+    for name in ('a', 'b', 'c'):
+        (tmp_path / name).write_text("${X}" + name)
+    for name in ('a', 'b', 'c', 'c', 'a'):
+        cache.get(str(tmp_path / name))
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_is_template_file_scans_each_version_once(tmp_path, monkeypatch):
+    filename = tmp_path / 'shared.cfg'
+    filename.write_text("plain\n")
+    scanned = []
+    original = template._scan_for_template
+    monkeypatch.setattr(template._template_scan_cache, '_loader', lambda path: scanned.append(path) or original(path))
+    assert not is_template_file(str(filename))
+    assert not is_template_file(str(filename))
+    assert len(scanned) == 1
+    filename.write_text("host=${HOST}\n")
+    assert is_template_file(str(filename))
+    assert len(scanned) == 2
+
+
+def test_rendered_template_cache_keys_on_resolved_values():
+    template_file = TemplateFile("url=${URL}\n")
+    cache = RenderedTemplateCache()
+    properties = Properties(URL='http://${HOST}', HOST='a')
+    assert cache.render(template_file, properties) == "url=http://a\n"
+    properties['HOST'] = 'b'
+    assert cache.render(template_file, properties) == "url=http://b\n"
+    assert cache.render(template_file, Properties(URL='http://${HOST}', HOST='b').freeze()) == "url=http://b\n"
+    assert (cache.hits, cache.misses) == (1, 2)
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from bootstrapper.utils import Error, copytree, fastcopy, walktree
+
+from conftest import write_files
+
+
+def _read(path):
+    if os.path.islink(path):
+        return os.readlink(path)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _tree(directory):
+    found = {}
+    for (parent, dirnames, filenames) in os.walk(directory):
+        for name in dirnames:
+            found[os.path.relpath(os.path.join(parent, name), directory)] = None
+        for name in filenames:
+            found[os.path.relpath(os.path.join(parent, name), directory)] = _read(os.path.join(parent, name))
+    return found
+
+
+@pytest.fixture
+def source(tmp_path):
+    write_files(tmp_path, {'src/a.txt': "a", 'src/b/c.txt': "c", 'src/b/d/e.bin': b'\x00e', 'src/skip.tmp': "skip"})
+    os.makedirs(str(tmp_path / 'src' / 'empty'))
+    os.symlink('a.txt', str(tmp_path / 'src' / 'link'))
+    os.utime(str(tmp_path / 'src' / 'b'), (1000000000, 1000000000))
+    return tmp_path / 'src'
+
+
+@pytest.mark.parametrize('max_workers', [None, 4])
+def test_copytree_copies_everything(source, tmp_path, max_workers):
+    destination = tmp_path / 'dst'
+    copytree(str(source), str(destination), symlinks=True, max_workers=max_workers)
+    assert _tree(str(destination)) == _tree(str(source))
+    assert os.path.islink(str(destination / 'link'))
+    assert os.stat(str(destination / 'b')).st_mtime == 1000000000
+
+
+def test_copytree_follows_symlinks_and_ignores_names(source, tmp_path):
+    destination = tmp_path / 'dst'
+    copytree(str(source), str(destination), ignore=lambda directory, names: [name for name in names if name.endswith('.tmp')])
+    assert not os.path.islink(str(destination / 'link'))
+    assert (destination / 'link').read_text() == "a"
+    assert not (destination / 'skip.tmp').exists()
+
+
+def test_copytree_collects_errors(source, tmp_path):
+    def failing_copy(src, dst):
+        raise OSError("copy failed")
+
+    with pytest.raises(Error) as raised:
+        copytree(str(source), str(tmp_path / 'dst'), copy_function=failing_copy, max_workers=2)
+    assert len(raised.value.args[0]) == 5
+
+
+def test_fastcopy_copies_contents(tmp_path):
+    write_files(tmp_path, {'src.bin': b'\x00' * 100000 + b'end'})
+    fastcopy(str(tmp_path / 'src.bin'), str(tmp_path / 'dst.bin'))
+    assert (tmp_path / 'dst.bin').read_bytes() == (tmp_path / 'src.bin').read_bytes()
+
+
+def test_walktree_lists_files_and_optionally_directories(source):
+    files = [os.path.relpath(path, str(source)) for path in walktree(str(source), ignore=lambda directory, names: ['skip.tmp'])]
+    assert sorted(files) == ['a.txt', 'b/c.txt', 'b/d/e.bin', 'link']
+    entries = [os.path.relpath(path, str(source)) + (os.sep if path.endswith(os.sep) else '')
+            for path in walktree(str(source), directories=True)]
+    assert {'b/', 'b/d/', 'empty/'} <= set(entries)
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from bootstrapper.selector import ALL_DEPLOYMENTS
+from bootstrapper.watch import DependencyGraph, InotifyWatcher, PollingWatcher
+from commands import _index_deployments, _load_deployment
+from commands.deploy import DeploymentGenerator
+
+from conftest import deployments_directory, read_file, run_bootstrap, write_files
+
+
+def test_dependency_graph_maps_paths_to_deployments(tmp_path):
+    graph = DependencyGraph()
+    graph.add('a', [str(tmp_path / 'a.properties')], [str(tmp_path / 'overrides' / 'a')])
+    graph.add('b', [], [str(tmp_path / 'common')])
+    assert graph.affected_by([str(tmp_path / 'a.properties')]) == {'a'}
+    assert graph.affected_by([str(tmp_path / 'overrides' / 'a' / 'config' / 'new.cfg')]) == {'a'}
+    assert graph.affected_by([str(tmp_path / 'common')]) == {'b'}
+    assert graph.affected_by([str(tmp_path / 'overrides')]) == {'a'}
+    assert graph.affected_by([str(tmp_path / 'unrelated.txt')]) == set()
+
+    graph.remove('a')
+    assert graph.keys == {'b'}
+    assert graph.affected_by([str(tmp_path / 'a.properties')]) == set()
+
+
+def _watchers():
+    yield PollingWatcher
+    yield pytest.param(InotifyWatcher, marks=pytest.mark.skipif(not os.path.isdir('/proc/self/fdinfo'), reason="inotify requires Linux"))
+
+
+@pytest.mark.parametrize('watcher_class', _watchers())
+def test_watcher_reports_relevant_changes(tmp_path, watcher_class):
+    write_files(tmp_path, {'common/a.properties': "A=1\n", 'deployments/out.txt': ""})
+    kwargs = {'interval': 0.01} if watcher_class is PollingWatcher else {}
+    with watcher_class(str(tmp_path), excluded=[str(tmp_path / 'deployments')], **kwargs) as watcher:
+        write_files(tmp_path, {'deployments/out.txt': "ignored", 'common/.a.properties.swp': "ignored"})
+        assert watcher.wait(0.2) == set()
+        write_files(tmp_path, {'common/a.properties': "A=22\n"})
+        assert str(tmp_path / 'common' / 'a.properties') in watcher.wait(2)
+
+
+def test_update_recreates_only_affected_deployments(config_repo):
+    run_bootstrap('deploy', '-p', config_repo)
+    generator = DeploymentGenerator(_index_deployments, _load_deployment)
+    generator._io_threads = 1
+    graph = DependencyGraph()
+    for entry in _index_deployments(str(config_repo)).values():
+        deployment = _load_deployment(entry)
+        graph.add(deployment.key, deployment.input_files(), [deployment.common_directory, deployment.overrides_directory])
+    app = os.path.join(deployments_directory(config_repo), 'dev', 'AM1', 'app')
+    write_files(app, {'s2/i1/marker': ""})
+
+    write_files(config_repo, {'overrides/app/s1/i1/config/instance.cfg': "${STRIPE}\n"})
+    changed = {os.path.join(str(config_repo), 'overrides', 'app', 's1', 'i1', 'config', 'instance.cfg')}
+    (created, errors) = generator._update_deployments(str(config_repo), changed, deployments_directory(config_repo), ALL_DEPLOYMENTS, None, graph)
+    assert (created, errors) == (1, [])
+    assert read_file(app, 's1', 'i1', 'config', 'instance.cfg') == "s1\n"
+    assert os.path.exists(os.path.join(app, 's2', 'i1', 'marker'))
+
+
+def test_polling_watcher_reports_new_directories(tmp_path):
+    write_files(tmp_path, {'overrides/app/s1/i1/app_params.json': {}})
+    with PollingWatcher(str(tmp_path), interval=0.01) as watcher:
+        os.makedirs(str(tmp_path / 'overrides' / 'app' / 's1' / 'i1' / 'logs'))
+        assert watcher.wait(1) == {str(tmp_path / 'overrides' / 'app' / 's1' / 'i1' / 'logs')}